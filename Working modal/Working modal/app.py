@@ -1,19 +1,35 @@
+import hashlib
+import hmac
+import mimetypes
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, session, send_from_directory
-from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+import time
+import click
+from flask import Flask, Response, abort, current_app, g, make_response, render_template, request, redirect, url_for, flash, session, send_file
+from sqlalchemy import and_, bindparam, case, column, event, func, literal, literal_column, or_, select, table, text, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from functools import wraps
+from jinja2 import FileSystemBytecodeCache
+from dispatcher import NotificationDispatcher, chunked
+from cache import TTLCache
+from schema import explain, upgrade_schema
+from pagination import decode_cursor, encode_cursor, keyset_page
+from search import fts_table, install_fts, match_expression
+from storage import ContentStore
+from tracking import BufferedCounter
+from sqlite_engine import RoutingSQLAlchemy, engine_options, read_only
+from passwords import HasherBusy, PasswordHasher
+from provisioning import clean_user, detect_format, read_users
+from schedule import Entry, TimetableIndex
+from leaves import Leave, month_bounds, month_view, neighbour_months, review_pending
+from metrics import RequestMetrics
+from jobs import JobRunner
+from registry import Registry, extension
+from assets import AssetPipeline
 
-app = Flask(__name__, template_folder='templates')
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///student_portal.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = 'your-secret-key-here'
-app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-db = SQLAlchemy(app)
+db = RoutingSQLAlchemy()
+portal = Registry()
 
 # Database Models
 class User(db.Model):
@@ -46,6 +62,11 @@ class LeaveApplication(db.Model):
     status = db.Column(db.String(20), default='pending')  # pending, approved, rejected
     reviewer_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     reviewed_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_leave_applications_status_dates', 'status', 'start_date', 'end_date'),
+        db.Index('ix_leave_applications_applicant_dates', 'applicant_id', 'start_date', 'end_date'),
+    )
 
 class Announcement(db.Model):
     __tablename__ = 'announcements'
@@ -56,6 +77,10 @@ class Announcement(db.Model):
     posted_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
     is_urgent = db.Column(db.Boolean, default=False)
+    
+    __table_args__ = (
+        db.Index('ix_announcements_created_at', 'created_at'),
+    )
 
 class StudyMaterial(db.Model):
     __tablename__ = 'study_materials'
@@ -68,6 +93,24 @@ class StudyMaterial(db.Model):
     uploaded_at = db.Column(db.DateTime, default=datetime.now)
     subject = db.Column(db.String(100))
     file_type = db.Column(db.String(50))
+    sha256 = db.Column(db.String(64))  # None for files saved before content addressing
+    file_size = db.Column(db.Integer)
+    mime_type = db.Column(db.String(100))
+    download_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    __table_args__ = (
+        db.Index('ix_study_materials_uploaded_by_uploaded_at', 'uploaded_by', 'uploaded_at'),
+        db.Index('ix_study_materials_uploaded_at', 'uploaded_at'),
+        db.Index('ix_study_materials_sha256', 'sha256'),
+    )
+
+class FileBlob(db.Model):
+    __tablename__ = 'file_blobs'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.now)
 
 class Message(db.Model):
     __tablename__ = 'messages'
@@ -78,6 +121,26 @@ class Message(db.Model):
     recipient_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     sent_at = db.Column(db.DateTime, default=datetime.now)
     is_read = db.Column(db.Boolean, default=False)
+    
+    __table_args__ = (
+        db.Index('ix_messages_recipient_read_sent', 'recipient_id', 'is_read', 'sent_at'),
+        db.Index('ix_messages_pair', 'sender_id', 'recipient_id', 'id'),
+    )
+
+class Conversation(db.Model):
+    """One participant's summary of a chat thread, updated as messages are sent and read."""
+    __tablename__ = 'conversations'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    partner_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    last_message_id = db.Column(db.Integer)
+    last_message = db.Column(db.String(200))
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+    last_activity = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    
+    __table_args__ = (
+        db.Index('ix_conversations_user_activity', 'user_id', 'last_activity'),
+    )
 
 class Timetable(db.Model):
     __tablename__ = 'timetables'
@@ -89,6 +152,10 @@ class Timetable(db.Model):
     faculty_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     classroom = db.Column(db.String(50))
     department = db.Column(db.String(50))
+    
+    __table_args__ = (
+        db.Index('ix_timetables_department', 'department'),
+    )
 
 class Notification(db.Model):
     __tablename__ = 'notifications'
@@ -99,8 +166,116 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.now)
     link = db.Column(db.String(200))
+    
+    __table_args__ = (
+        db.Index('ix_notifications_user_read_created', 'user_id', 'is_read', 'created_at'),
+        # Serves the notifications page's ORDER BY created_at DESC, id DESC without a sort
+        db.Index('ix_notifications_user_created', 'user_id', 'created_at', 'id'),
+    )
+
+class BroadcastNotification(db.Model):
+    __tablename__ = 'broadcast_notifications'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    content = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    link = db.Column(db.String(200))
+    role = db.Column(db.String(20))  # None means every role
+    department = db.Column(db.String(50))  # None means every department
+    
+    __table_args__ = (
+        db.Index('ix_broadcast_notifications_created', 'created_at', 'id'),
+    )
+
+class BroadcastReceipt(db.Model):
+    __tablename__ = 'broadcast_receipts'
+    
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    last_read_id = db.Column(db.Integer, nullable=False, default=0)
+    cleared_id = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # hidden by Clear All
+
+class Counter(db.Model):
+    __tablename__ = 'counters'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True, default=0)  # 0 for global counters
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        # read_counters looks up by user; the primary key leads with name
+        db.Index('ix_counters_user_name', 'user_id', 'name'),
+    )
+
+class BackgroundJob(db.Model):
+    __tablename__ = 'background_jobs'
+    
+    id = db.Column(db.String(12), primary_key=True)
+    name = db.Column(db.String(200), nullable=False)
+    state = db.Column(db.String(20), nullable=False)
+    snapshot = db.Column(db.Text, nullable=False)  # Job.to_dict() as JSON, for any worker to read
+    created_at = db.Column(db.DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        db.Index('ix_background_jobs_created_at', 'created_at'),
+    )
+
+MATERIAL_SEARCH_COLUMNS = ('title', 'description', 'subject')
+
+@event.listens_for(StudyMaterial.__table__, 'after_create')
+def create_material_search_index(target, connection, **kw):
+    install_fts(connection, target.name, MATERIAL_SEARCH_COLUMNS)
+
+# create_app makes these for each app; the names find the current app's
+content_store = extension('content_store')
+dispatcher = extension('notification_dispatcher')
+password_hasher = extension('password_hasher')
+job_runner = extension('job_runner')
+
+def write_download_counts(counts):
+    db.session.execute(
+        StudyMaterial.__table__.update().where(
+            StudyMaterial.id == bindparam('material_id')
+        ).values(
+            download_count=func.coalesce(StudyMaterial.download_count, 0) + bindparam('hits')
+        ),
+        [{'material_id': material_id, 'hits': hits} for material_id, hits in counts.items()]
+    )
+    db.session.commit()
+
+download_tracker = extension('download_tracker')
+identity_cache = extension('identity_cache')
+request_metrics = extension('request_metrics')
+asset_pipeline = extension('asset_pipeline')
 
 # Helper Functions
+def current_user():
+    """Return the logged-in User, loading it at most once per request."""
+    if 'user' not in g:
+        g.user = User.query.get(session['user_id']) if 'user_id' in session else None
+    return g.user
+
+def current_identity():
+    """Return ``(role, department)`` for the logged-in user, or None.
+    
+    Served from ``identity_cache`` when USER_CACHE_TTL is set, so role checks
+    on routes that never touch the user don't need a query at all.
+    """
+    if 'user_id' not in session:
+        return None
+    identity = identity_cache.get(session['user_id'])
+    if identity is None:
+        user = current_user()
+        if user is None:
+            return None
+        identity = (user.role, user.department)
+        identity_cache.set(user.id, identity)
+    return identity
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def invalidate_user(mapper, connection, user):
+    identity_cache.invalidate(user.id)
+
 def login_required(role="any"):
     def wrapper(f):
         @wraps(f)
@@ -109,13 +284,19 @@ def login_required(role="any"):
                 flash('Please log in to access this page.', 'danger')
                 return redirect(url_for('login'))
             
-            user = User.query.get(session['user_id'])
+            identity = current_identity()
+            if identity is None:
+                session.clear()
+                flash('Please log in to access this page.', 'danger')
+                return redirect(url_for('login'))
+            
+            user_role = identity[0]
             if role != "any":
                 if isinstance(role, list):
-                    if user.role not in role:
+                    if user_role not in role:
                         flash('You do not have permission to access this page.', 'danger')
                         return redirect(url_for('dashboard'))
-                elif user.role != role:
+                elif user_role != role:
                     flash('You do not have permission to access this page.', 'danger')
                     return redirect(url_for('dashboard'))
             
@@ -130,33 +311,319 @@ def create_notification(user_id, content, link=None):
         link=link
     )
     db.session.add(notification)
+    bump_counter('unread_notifications', user_id=user_id)
+    db.session.commit()
+
+def fan_out_notification(content, link=None, role=None, user_ids=None):
+    """Queue a notification for ``user_ids``, every user with ``role``, or everyone."""
+    def rows():
+        if user_ids is not None:
+            recipients = user_ids
+        else:
+            query = db.session.query(User.id)
+            if role is not None:
+                query = query.filter(User.role == role)
+            recipients = [user_id for user_id, in query]
+        now = datetime.now()
+        for user_id in recipients:
+            yield {'user_id': user_id, 'content': content, 'link': link,
+                   'is_read': False, 'created_at': now}
+    def count_unread(chunk):
+        bump_counters('unread_notifications', [row['user_id'] for row in chunk])
+    dispatcher.submit(rows, on_batch=count_unread)
+
+def broadcast_notification(content, link=None, role=None, department=None):
+    """Store one notification shown to every user matching ``role`` and ``department``."""
+    db.session.add(BroadcastNotification(
+        content=content,
+        link=link,
+        role=role,
+        department=department
+    ))
+    db.session.commit()
+
+def broadcasts_for(user):
+    query = BroadcastNotification.query.filter(
+        or_(BroadcastNotification.role.is_(None), BroadcastNotification.role == user.role),
+        or_(BroadcastNotification.department.is_(None), BroadcastNotification.department == user.department)
+    )
+    if user.created_at is not None:
+        # Users only see broadcasts sent after they joined
+        query = query.filter(BroadcastNotification.created_at >= user.created_at)
+    cleared = select(BroadcastReceipt.cleared_id).where(BroadcastReceipt.user_id == user.id)
+    return query.filter(BroadcastNotification.id > func.coalesce(cleared.scalar_subquery(), 0))
+
+def broadcast_watermark(user_id):
+    receipt = BroadcastReceipt.query.get(user_id)
+    return receipt.last_read_id if receipt else 0
+
+def unread_broadcasts(user):
+    return broadcasts_for(user).filter(
+        BroadcastNotification.id > broadcast_watermark(user.id)
+    )
+
+def unread_broadcast_count(user):
+    return unread_broadcasts(user).count()
+
+def unread_notification_count(user):
+    personal = read_counters(user.id).get('unread_notifications', 0)
+    return personal + unread_broadcast_count(user)
+
+def bump_counters(name, user_ids, delta=1):
+    """Add ``delta`` to counter ``name`` of each of ``user_ids`` in the current transaction.
+    
+    Counters never go below zero, including one first created by a negative
+    ``delta`` before reconcile-counters has filled it in.
+    """
+    upsert = sqlite_insert(Counter).values(
+        name=bindparam('name'), user_id=bindparam('user_id'), value=func.max(bindparam('delta'), 0)
+    )
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[Counter.name, Counter.user_id],
+        set_={'value': func.max(Counter.value + bindparam('delta'), 0)}
+    )
+    db.session.execute(upsert, [
+        {'name': name, 'user_id': user_id, 'delta': delta} for user_id in user_ids
+    ])
+
+def bump_counter(name, delta=1, user_id=0):
+    bump_counters(name, [user_id], delta)
+
+def counters_for(user_id):
+    return Counter.query.filter(Counter.user_id.in_([0, user_id]))
+
+def read_counters(user_id):
+    """Return the global counters and ``user_id``'s own counters as one dict."""
+    return {row.name: row.value for row in counters_for(user_id)}
+
+def rebuild_counters():
+    """Recompute every counter from the source tables and return how many were written."""
+    sources = [
+        ('users', db.session.query(literal(0), func.count(User.id))),
+        ('pending_leaves', db.session.query(literal(0), func.count(LeaveApplication.id)).filter(
+            LeaveApplication.status == 'pending'
+        )),
+        ('unread_notifications', db.session.query(Notification.user_id, func.count(Notification.id)).filter_by(
+            is_read=False
+        ).group_by(Notification.user_id)),
+        ('unread_messages', db.session.query(Message.recipient_id, func.count(Message.id)).filter_by(
+            is_read=False
+        ).group_by(Message.recipient_id)),
+    ]
+    # Only the counters derived here; others, like timetable_version, are kept
+    Counter.query.filter(Counter.name.in_([name for name, _ in sources])).delete(synchronize_session=False)
+    rows = [
+        {'name': name, 'user_id': user_id, 'value': value}
+        for name, query in sources
+        for user_id, value in query
+    ]
+    if rows:
+        db.session.execute(Counter.__table__.insert(), rows)
+    db.session.commit()
+    return len(rows)
+
+@event.listens_for(Timetable, 'after_insert')
+@event.listens_for(Timetable, 'after_update')
+@event.listens_for(Timetable, 'after_delete')
+def touch_timetables(mapper, connection, target):
+    """Move timetable_version on, so every worker recompiles its grids.
+    
+    The version is the change time in milliseconds, kept strictly
+    increasing, and doubles as the timetable's Last-Modified. Changes made
+    outside the ORM should bump it the same way.
+    """
+    upsert = sqlite_insert(Counter).values(
+        name='timetable_version', user_id=0, value=int(time.time() * 1000)
+    )
+    connection.execute(upsert.on_conflict_do_update(
+        index_elements=[Counter.name, Counter.user_id],
+        set_={'value': func.max(Counter.value + 1, upsert.excluded.value)}
+    ))
+
+def timetable_version_query():
+    return db.session.query(Counter.value).filter_by(name='timetable_version', user_id=0)
+
+def timetable_index():
+    """Return the compiled timetables, recompiling them if a timetable row changed."""
+    version = timetable_version_query().scalar() or 0
+    compiled_timetables = current_app.extensions['compiled_timetables']
+    index = compiled_timetables.get('index')
+    if index is None or index.version != version:
+        rows = db.session.query(
+            Timetable.id, Timetable.day, Timetable.time_slot, Timetable.subject,
+            Timetable.classroom, Timetable.department, Timetable.faculty_id, User.name
+        ).outerjoin(User, User.id == Timetable.faculty_id)
+        index = TimetableIndex(version, [Entry(*row) for row in rows])
+        compiled_timetables['index'] = index
+    return index
+
+def request_cursor(sources=1):
+    """Decode the ``cursor`` query argument into one keyset key per source."""
+    token = request.args.get('cursor')
+    if not token:
+        return [None] * sources
+    try:
+        return decode_cursor(token, sources)
+    except ValueError:
+        abort(400)
+
+def render_fragment(template, next_cursor, **context):
+    """Render a "load more" fragment, passing the following page's cursor in a header."""
+    response = make_response(render_template(template, **context))
+    response.headers['X-Next-Cursor'] = next_cursor or ''
+    return response
+
+def record_message(message):
+    """Update both participants' conversation rows for a new, flushed ``message``."""
+    upsert = sqlite_insert(Conversation)
+    upsert = upsert.on_conflict_do_update(
+        index_elements=[Conversation.user_id, Conversation.partner_id],
+        set_={
+            'last_message_id': upsert.excluded.last_message_id,
+            'last_message': upsert.excluded.last_message,
+            'last_activity': upsert.excluded.last_activity,
+            'unread_count': Conversation.unread_count + upsert.excluded.unread_count,
+        }
+    )
+    summary = {'last_message_id': message.id, 'last_message': message.content[:200],
+               'last_activity': message.sent_at}
+    db.session.execute(upsert, [
+        dict(summary, user_id=message.sender_id, partner_id=message.recipient_id, unread_count=0),
+        dict(summary, user_id=message.recipient_id, partner_id=message.sender_id, unread_count=1),
+    ])
+    bump_counter('unread_messages', user_id=message.recipient_id)
+
+def rebuild_conversations():
+    """Recompute every conversation row from the messages table; returns how many were written."""
+    sides = union_all(
+        db.session.query(Message.sender_id.label('user_id'), Message.recipient_id.label('partner_id'),
+                         Message.id.label('message_id'), literal(0).label('unread')),
+        db.session.query(Message.recipient_id, Message.sender_id, Message.id,
+                         case((Message.is_read == True, 0), else_=1)),
+    ).subquery()
+    threads = db.session.query(
+        sides.c.user_id, sides.c.partner_id,
+        func.max(sides.c.message_id).label('last_message_id'),
+        func.sum(sides.c.unread).label('unread_count')
+    ).group_by(sides.c.user_id, sides.c.partner_id).subquery()
+    rows = db.session.query(
+        threads.c.user_id, threads.c.partner_id, threads.c.last_message_id,
+        func.substr(Message.content, 1, 200), threads.c.unread_count, Message.sent_at
+    ).join(Message, Message.id == threads.c.last_message_id)
+    
+    Conversation.query.delete(synchronize_session=False)
+    values = [
+        {'user_id': user_id, 'partner_id': partner_id, 'last_message_id': message_id,
+         'last_message': content, 'unread_count': unread, 'last_activity': sent_at or datetime.now()}
+        for user_id, partner_id, message_id, content, unread, sent_at in rows
+    ]
+    if values:
+        db.session.execute(Conversation.__table__.insert(), values)
+    db.session.commit()
+    return len(values)
+
+def message_json(message, user):
+    return {
+        'id': message.id,
+        'content': message.content,
+        'sent_at': message.sent_at.isoformat() if message.sent_at else None,
+        'time': datetimeformat(message.sent_at, '%b %d, %I:%M %p'),
+        'mine': message.sender_id == user.id,
+    }
+
+def store_upload(file):
+    """Save an uploaded file to the content store and take a reference to it.
+    
+    Returns ``(digest, size, mime_type)``; the reference is committed with
+    the caller's transaction. The file is moved into place only after the
+    reference is taken, while this transaction holds the write lock, so
+    ``delete_unreferenced_files`` cannot remove it in between.
+    """
+    digest, size, tmp_path = content_store.stage(file.stream)
+    upsert = sqlite_insert(FileBlob).values(sha256=digest, size=size, ref_count=1, created_at=datetime.now())
+    try:
+        db.session.execute(upsert.on_conflict_do_update(
+            index_elements=[FileBlob.sha256],
+            set_={'ref_count': FileBlob.ref_count + 1}
+        ))
+    except BaseException:
+        content_store.discard(tmp_path)
+        raise
+    content_store.place(digest, tmp_path)
+    mime_type = mimetypes.guess_type(file.filename)[0] or file.mimetype or 'application/octet-stream'
+    return digest, size, mime_type
+
+def release_upload(digest):
+    """Drop one reference to a stored file in the current transaction.
+    
+    Returns True when that was the last reference. The file itself stays
+    until ``delete_unreferenced_files`` runs after the commit, so a failed
+    commit never leaves rows pointing at a deleted file.
+    """
+    FileBlob.query.filter_by(sha256=digest).update(
+        {'ref_count': FileBlob.ref_count - 1}, synchronize_session=False
+    )
+    unused = FileBlob.query.filter(FileBlob.sha256 == digest, FileBlob.ref_count <= 0)
+    return bool(unused.delete(synchronize_session=False))
+
+def delete_unreferenced_files(digests):
+    """Delete the stored files of ``digests`` that no FileBlob refers to any more.
+    
+    Call once the releases are committed. The check runs in its own write
+    transaction, so an upload of the same content either took its reference
+    first, and the file is kept, or puts the file back after this removes it.
+    """
+    digests = set(digests)
+    if not digests:
+        return
+    # A write statement first, so the lock is held from before the check until the commit
+    FileBlob.query.filter(
+        FileBlob.sha256.in_(digests), FileBlob.ref_count <= 0
+    ).delete(synchronize_session=False)
+    kept = {digest for digest, in db.session.query(FileBlob.sha256).filter(FileBlob.sha256.in_(digests))}
+    for digest in digests - kept:
+        content_store.delete(digest)
     db.session.commit()
 
 # Middleware
-@app.before_request
+@portal.before_request
 def sync_user_role():
-    if 'user_id' in session:
-        user = User.query.get(session['user_id'])
-        if user and user.role != session.get('user_role'):
-            session['user_role'] = user.role
-            flash('Your permissions have been updated', 'info')
+    if request.endpoint in ('static', 'asset'):
+        return  # no session lookup, so static files stay cacheable by shared caches
+    identity = current_identity()
+    if identity is not None and identity[0] != session.get('user_role'):
+        session['user_role'] = identity[0]
+        flash('Your permissions have been updated', 'info')
 
 # Authentication Routes
-@app.route('/')
+@portal.route('/')
 def home():
     if 'user_id' in session:
         return redirect(url_for('dashboard'))
     return render_template('auth/login.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+@portal.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
         
         user = User.query.filter_by(email=email).first()
+        stored_hash = user.password if user else None
+        # Hand the database connection back while the hash runs
+        db.session.commit()
+        
+        try:
+            valid, new_hash = password_hasher.verify(stored_hash, password) if user else (False, None)
+        except HasherBusy:
+            flash('Too many people are signing in right now. Please try again in a few seconds.', 'warning')
+            return render_template('auth/login.html'), 503, {'Retry-After': '5'}
         
-        if user and check_password_hash(user.password, password):
+        if valid:
+            if new_hash:
+                # Stored with older hash parameters; upgrade while we have the password
+                user.password = new_hash
+                db.session.commit()
             session['user_id'] = user.id
             session['user_role'] = user.role
             session['user_name'] = user.name
@@ -167,7 +634,7 @@ def login():
     
     return render_template('auth/login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@portal.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         name = request.form.get('name')
@@ -184,15 +651,23 @@ def register():
             flash('Invalid role specified', 'danger')
             return redirect(url_for('register'))
         
+        db.session.commit()
+        try:
+            password_hash = password_hasher.hash(password)
+        except HasherBusy:
+            flash('The server is busy. Please try again in a few seconds.', 'warning')
+            return render_template('auth/register.html'), 503, {'Retry-After': '5'}
+        
         new_user = User(
             name=name,
             email=email,
-            password=generate_password_hash(password),
+            password=password_hash,
             role=role.lower(),
             department=department
         )
         
         db.session.add(new_user)
+        bump_counter('users')
         db.session.commit()
         
         flash('Registration successful! Please login.', 'success')
@@ -200,28 +675,36 @@ def register():
     
     return render_template('auth/register.html')
 
-@app.route('/logout')
+@portal.route('/logout')
 def logout():
     session.clear()
     flash('You have been logged out.', 'info')
     return redirect(url_for('login'))
 
 # Dashboard Routes
-@app.route('/dashboard')
+def latest_announcements():
+    return Announcement.query.order_by(Announcement.created_at.desc()).limit(5)
+
+def latest_materials(uploaded_by=None):
+    query = StudyMaterial.query
+    if uploaded_by is not None:
+        query = query.filter_by(uploaded_by=uploaded_by)
+    return query.order_by(StudyMaterial.uploaded_at.desc()).limit(3)
+
+@portal.route('/dashboard')
+@read_only
 @login_required(role="any")
 def dashboard():
-    user = User.query.get(session['user_id'])
+    user = current_user()
     
-    # Get unread notifications count
-    unread_notifications = Notification.query.filter_by(
-        user_id=user.id,
-        is_read=False
-    ).count()
+    # Counters are kept up to date by the writes, so this is a single lookup
+    counters = read_counters(user.id)
+    unread_notifications = counters.get('unread_notifications', 0) + unread_broadcast_count(user)
+    pending_leaves = counters.get('pending_leaves', 0)
     
     if user.role == 'admin':
-        announcements = Announcement.query.order_by(Announcement.created_at.desc()).limit(5).all()
-        pending_leaves = LeaveApplication.query.filter_by(status='pending').count()
-        total_users = User.query.count()
+        announcements = latest_announcements().all()
+        total_users = counters.get('users', 0)
         
         return render_template('admin/dashboard.html', 
                              announcements=announcements,
@@ -230,13 +713,9 @@ def dashboard():
                              unread_notifications=unread_notifications)
     
     elif user.role == 'faculty':
-        announcements = Announcement.query.order_by(Announcement.created_at.desc()).limit(5).all()
-        unread_messages = Message.query.filter_by(
-            recipient_id=user.id,
-            is_read=False
-        ).count()
-        materials = StudyMaterial.query.filter_by(uploaded_by=user.id).order_by(StudyMaterial.uploaded_at.desc()).limit(3).all()
-        pending_leaves = LeaveApplication.query.filter_by(status='pending').count()
+        announcements = latest_announcements().all()
+        unread_messages = counters.get('unread_messages', 0)
+        materials = latest_materials(uploaded_by=user.id).all()
         
         return render_template('faculty/dashboard.html', 
                              announcements=announcements,
@@ -246,24 +725,44 @@ def dashboard():
                              unread_notifications=unread_notifications)
     
     else:  # student
-        announcements = Announcement.query.order_by(Announcement.created_at.desc()).limit(5).all()
-        timetable = Timetable.query.filter_by(department=user.department).all()
-        recent_materials = StudyMaterial.query.order_by(StudyMaterial.uploaded_at.desc()).limit(3).all()
+        announcements = latest_announcements().all()
+        grid = timetable_index().grid_for(user.department)
+        recent_materials = latest_materials().all()
         
         return render_template('student/dashboard.html', 
                              announcements=announcements,
-                             timetable=timetable,
+                             grid=grid,
                              recent_materials=recent_materials,
                              unread_notifications=unread_notifications)
 
 # Announcements Routes
-@app.route('/announcements')
+def announcement_page():
+    after, = request_cursor()
+    page = keyset_page(
+        Announcement.query.options(db.joinedload(Announcement.author)),
+        Announcement.created_at, Announcement.id,
+        after, current_app.config['PAGE_SIZE']
+    )
+    return page.items, page.next_key and encode_cursor(page.next_key)
+
+@portal.route('/announcements')
+@read_only
 @login_required(role="any")
 def announcements():
-    announcements = Announcement.query.order_by(Announcement.created_at.desc()).all()
-    return render_template('announcements.html', announcements=announcements)
+    announcements, next_cursor = announcement_page()
+    return render_template('announcements.html',
+                         announcements=announcements,
+                         next_cursor=next_cursor)
+
+@portal.route('/announcements/more')
+@read_only
+@login_required(role="any")
+def announcements_more():
+    announcements, next_cursor = announcement_page()
+    return render_fragment('partials/announcement_items.html', next_cursor,
+                           announcements=announcements)
 
-@app.route('/announcements/new', methods=['GET', 'POST'])
+@portal.route('/announcements/new', methods=['GET', 'POST'])
 @login_required(role=["faculty", "admin"])
 def new_announcement():
     if request.method == 'POST':
@@ -281,14 +780,11 @@ def new_announcement():
         db.session.add(announcement)
         db.session.commit()
         
-        # Create notifications for all users
-        users = User.query.all()
-        for user in users:
-            create_notification(
-                user.id,
-                f"New announcement: {title}",
-                url_for('announcements')
-            )
+        # Notify all users
+        broadcast_notification(
+            f"New announcement: {title}",
+            url_for('announcements')
+        )
         
         flash('Announcement posted successfully!', 'success')
         return redirect(url_for('announcements'))
@@ -296,16 +792,99 @@ def new_announcement():
     return render_template('new_announcement.html')
 
 # Study Materials Routes
-@app.route('/materials')
+def material_page():
+    after, = request_cursor()
+    page = keyset_page(
+        StudyMaterial.query.options(db.joinedload(StudyMaterial.uploader)),
+        StudyMaterial.uploaded_at, StudyMaterial.id,
+        after, current_app.config['PAGE_SIZE']
+    )
+    return page.items, page.next_key and encode_cursor(page.next_key)
+
+def material_facets(query):
+    """Count the materials matched by ``query`` per subject."""
+    return query.with_entities(
+        StudyMaterial.subject, func.count(StudyMaterial.id)
+    ).group_by(StudyMaterial.subject).order_by(StudyMaterial.subject).all()
+
+def search_materials(q, subject=None, file_type=None, page=1):
+    """Return ``(materials, facets, total, has_more)`` for one page of search results.
+    
+    Text matches are ranked by bm25 over the FTS5 index; without search text
+    the newest materials come first. Facets ignore the subject filter so the
+    other subjects stay selectable.
+    """
+    size = current_app.config['PAGE_SIZE']
+    query = db.session.query(StudyMaterial.id)
+    match = match_expression(q)
+    if match:
+        fts = table(fts_table(StudyMaterial.__tablename__), column('rowid'))
+        query = query.join(fts, fts.c.rowid == StudyMaterial.id).filter(
+            text(f'{fts.name} MATCH :match')
+        ).params(match=match)
+    if file_type:
+        query = query.filter(StudyMaterial.file_type == file_type)
+    
+    facets = material_facets(query)
+    counts = dict(facets)
+    total = counts.get(subject, 0) if subject else sum(counts.values())
+    
+    if subject:
+        query = query.filter(StudyMaterial.subject == subject)
+    if match:
+        query = query.order_by(text(f'bm25({fts.name})'), StudyMaterial.id.desc())
+    else:
+        query = query.order_by(StudyMaterial.uploaded_at.desc(), StudyMaterial.id.desc())
+    ids = [material_id for material_id, in query.offset((page - 1) * size).limit(size + 1)]
+    has_more = len(ids) > size
+    ids = ids[:size]
+    
+    found = StudyMaterial.query.options(
+        db.joinedload(StudyMaterial.uploader)
+    ).filter(StudyMaterial.id.in_(ids)).all() if ids else []
+    by_id = {material.id: material for material in found}
+    materials = [by_id[material_id] for material_id in ids if material_id in by_id]
+    return materials, [(s, n) for s, n in facets if s], total, has_more
+
+@portal.route('/materials')
+@read_only
 @login_required(role="any")
 def materials():
-    materials = StudyMaterial.query.order_by(StudyMaterial.uploaded_at.desc()).all()
-    subjects = list({m.subject for m in materials if m.subject})  # Get unique subjects
+    materials, next_cursor = material_page()
+    subjects = [(s, n) for s, n in material_facets(StudyMaterial.query) if s]
     return render_template('student/materials.html', 
                          materials=materials,
-                         subjects=subjects)
+                         subjects=subjects,
+                         next_cursor=next_cursor)
 
-@app.route('/materials/upload', methods=['GET', 'POST'])
+@portal.route('/materials/search')
+@read_only
+@login_required(role="any")
+def materials_search():
+    page = max(request.args.get('page', 1, type=int), 1)
+    materials, facets, total, has_more = search_materials(
+        request.args.get('q', ''),
+        request.args.get('subject') or None,
+        request.args.get('file_type') or None,
+        page
+    )
+    return {
+        'html': render_template('partials/material_items.html', materials=materials),
+        'facets': [{'subject': subject, 'count': count} for subject, count in facets],
+        'total': total,
+        'page': page,
+        'next_page': page + 1 if has_more else None,
+    }
+
+@portal.route('/materials/more')
+@read_only
+@login_required(role="any")
+def materials_more():
+    materials, next_cursor = material_page()
+    return render_fragment('partials/material_items.html', next_cursor,
+                           materials=materials)
+
+@portal.route('/materials/upload', methods=['GET', 'POST'])
 @login_required(role=["faculty", "admin"])
 def upload_material():
     if request.method == 'POST':
@@ -316,17 +895,18 @@ def upload_material():
         file = request.files['file']
         
         if file:
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+            digest, size, mime_type = store_upload(file)
             
             material = StudyMaterial(
                 title=title,
-                filename=filename,
+                filename=secure_filename(file.filename),
                 description=description,
                 uploaded_by=session['user_id'],
                 subject=subject,
-                file_type=file_type
+                file_type=file_type,
+                sha256=digest,
+                file_size=size,
+                mime_type=mime_type
             )
             
             db.session.add(material)
@@ -337,40 +917,173 @@ def upload_material():
     
     return render_template('faculty/upload.html')
 
-@app.route('/materials/download/<int:material_id>')
+@portal.route('/materials/download/<int:material_id>')
+@read_only
 @login_required(role="any")
 def download_material(material_id):
     material = StudyMaterial.query.get_or_404(material_id)
-    return send_from_directory(app.config['UPLOAD_FOLDER'], material.filename, as_attachment=True)
+    
+    if material.sha256 is None:
+        path = os.path.join(current_app.config['UPLOAD_FOLDER'], secure_filename(material.filename))
+        etag = True
+    else:
+        # Content-addressed, so the hash is a strong validator for the bytes
+        path = content_store.path_for(material.sha256)
+        etag = material.sha256
+    
+    prefix = current_app.config['ACCEL_REDIRECT_PREFIX']
+    if prefix:
+        relative = os.path.relpath(path, current_app.config['UPLOAD_FOLDER']).replace(os.sep, '/')
+        response = make_response('')
+        response.headers['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + relative
+        response.headers['Content-Type'] = material.mime_type or 'application/octet-stream'
+        response.headers['Content-Disposition'] = f'attachment; filename="{secure_filename(material.filename)}"'
+        if isinstance(etag, str):
+            response.set_etag(etag)
+    else:
+        if not os.path.isfile(path):
+            abort(404)
+        # send_file answers If-None-Match with 304 and Range with 206, or
+        # defers to the server when USE_X_SENDFILE is on
+        response = send_file(path,
+                             mimetype=material.mime_type,
+                             as_attachment=True,
+                             download_name=material.filename,
+                             etag=etag,
+                             conditional=True)
+    
+    response.headers['Accept-Ranges'] = 'bytes'
+    # Cacheable by the browser only, revalidated with the ETag once stale
+    response.cache_control.no_cache = None
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config['DOWNLOAD_CACHE_MAX_AGE']
+    return response
+
+@portal.route('/materials/track', methods=['POST'])
+@login_required(role="any")
+def track_download():
+    material_id = request.form.get('material_id', type=int)
+    if material_id is None:
+        abort(400)
+    download_tracker.record(material_id)
+    return '', 204
 
 # Chat & Feedback Routes
-@app.route('/chat')
+@portal.route('/chat')
+@read_only
 @login_required(role="any")
 def chat():
-    user = User.query.get(session['user_id'])
+    user = current_user()
+    partner_id = request.args.get('partner', type=int)
+    partner = User.query.get(partner_id) if partner_id else None
     
     if user.role == 'student':
-        faculty = User.query.filter_by(role='faculty').all()
-        return render_template('chat.html', faculty=faculty)
+        faculty = User.query.filter_by(role='faculty').order_by(User.name).all()
+        threads = {
+            conversation.partner_id: conversation
+            for conversation in Conversation.query.filter_by(user_id=user.id)
+        }
+        return render_template('chat.html', faculty=faculty, threads=threads, partner=partner)
+    else:
+        conversations, next_cursor = conversation_page(user)
+        return render_template('chat.html',
+                             conversations=conversations,
+                             next_cursor=next_cursor,
+                             partner=partner)
+
+def conversation_page(user):
+    after, = request_cursor()
+    query = db.session.query(
+        Conversation,
+        User.name
+    ).join(
+        User, Conversation.partner_id == User.id
+    ).filter(
+        Conversation.user_id == user.id
+    )
+    page = keyset_page(
+        query, Conversation.last_activity, Conversation.partner_id,
+        after, current_app.config['PAGE_SIZE'],
+        key=lambda row: (row.Conversation.last_activity, row.Conversation.partner_id)
+    )
+    return page.items, page.next_key and encode_cursor(page.next_key)
+
+@portal.route('/chat/conversations/more')
+@read_only
+@login_required(role=["faculty", "admin"])
+def conversations_more():
+    conversations, next_cursor = conversation_page(current_user())
+    return render_fragment('partials/conversation_items.html', next_cursor,
+                           conversations=conversations)
+
+def thread_query(user_id, partner_id):
+    return Message.query.filter(or_(
+        and_(Message.sender_id == user_id, Message.recipient_id == partner_id),
+        and_(Message.sender_id == partner_id, Message.recipient_id == user_id)
+    ))
+
+@portal.route('/chat/messages')
+@read_only
+@login_required(role="any")
+def chat_messages():
+    """Messages with ``partner``: the latest ones, or only those newer than ``after``."""
+    user = current_user()
+    partner_id = request.args.get('partner', type=int)
+    if partner_id is None:
+        abort(400)
+    after = request.args.get('after', type=int)
+    
+    query = thread_query(user.id, partner_id)
+    if after is None:
+        messages = query.order_by(Message.id.desc()).limit(current_app.config['CHAT_HISTORY']).all()[::-1]
     else:
-        conversations = db.session.query(
-            Message,
-            User.name
-        ).join(
-            User, Message.sender_id == User.id
-        ).filter(
-            Message.recipient_id == user.id
-        ).order_by(
-            Message.sent_at.desc()
+        messages = query.filter(Message.id > after).order_by(Message.id).limit(
+            current_app.config['CHAT_HISTORY']
         ).all()
-        
-        return render_template('chat.html', conversations=conversations)
+    return {
+        'messages': [message_json(message, user) for message in messages],
+        'last_id': messages[-1].id if messages else after,
+    }
+
+@portal.route('/chat/read', methods=['POST'])
+@login_required(role="any")
+def mark_chat_read():
+    """Mark messages from ``partner`` up to ``up_to`` (default: all) as read."""
+    user = current_user()
+    partner_id = request.form.get('partner', type=int)
+    if partner_id is None:
+        abort(400)
+    up_to = request.form.get('up_to', type=int)
+    
+    query = Message.query.filter(
+        Message.recipient_id == user.id,
+        Message.sender_id == partner_id,
+        Message.is_read == False
+    )
+    if up_to is not None:
+        query = query.filter(Message.id <= up_to)
+    marked = query.update({Message.is_read: True}, synchronize_session=False)
+    if marked:
+        Conversation.query.filter_by(user_id=user.id, partner_id=partner_id).update(
+            {Conversation.unread_count: func.max(Conversation.unread_count - marked, 0)},
+            synchronize_session=False
+        )
+        bump_counter('unread_messages', -marked, user.id)
+    db.session.commit()
+    return {'marked': marked}
 
-@app.route('/chat/send', methods=['POST'])
+@portal.route('/chat/send', methods=['POST'])
 @login_required(role="any")
 def send_message():
-    recipient_id = request.form.get('recipient_id')
-    content = request.form.get('content')
+    wants_json = request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+    recipient_id = request.form.get('recipient_id', type=int)
+    content = (request.form.get('content') or '').strip()
+    
+    if not content or recipient_id is None or User.query.get(recipient_id) is None:
+        if wants_json:
+            return {'error': 'A recipient and a message are required'}, 400
+        flash('Please choose a recipient and write a message', 'danger')
+        return redirect(url_for('chat'))
     
     message = Message(
         sender_id=session['user_id'],
@@ -379,40 +1092,164 @@ def send_message():
     )
     
     db.session.add(message)
+    db.session.flush()
+    record_message(message)
     db.session.commit()
     
-    sender = User.query.get(session['user_id'])
-    create_notification(
-        recipient_id,
-        f"New message from {sender.name}",
-        url_for('chat')
+    fan_out_notification(
+        f"New message from {session['user_name']}",
+        url_for('chat', partner=message.sender_id),
+        user_ids=[recipient_id]
     )
     
+    if wants_json:
+        return message_json(message, current_user()), 201
     flash('Message sent successfully!', 'success')
-    return redirect(url_for('chat'))
+    return redirect(url_for('chat', partner=recipient_id))
 
 # Timetable Routes
-@app.route('/timetable')
+@portal.route('/timetable')
+@read_only
 @login_required(role="any")
 def timetable():
-    user = User.query.get(session['user_id'])
+    user = current_user()
+    index = timetable_index()
     
     if user.role == 'student':
-        timetable = Timetable.query.filter_by(department=user.department).all()
+        grid, conflicts = index.grid_for(user.department), []
     else:
-        timetable = Timetable.query.all()
+        grid, conflicts = index.everything, index.conflicts
+    
+    # Rendering consumes pending flash messages, and a 304 would hide them
+    has_messages = bool(session.get('_flashes'))
+    response = make_response(render_template('timetable.html', grid=grid, conflicts=conflicts))
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    if has_messages:
+        return response
     
-    return render_template('timetable.html', timetable=timetable)
+    # The navbar shows who is logged in, so that is part of the validator too
+    response.set_etag(hashlib.sha1(f'{grid.etag}:{user.id}:{user.name}:{user.role}'.encode()).hexdigest())
+    if index.version:
+        response.last_modified = datetime.utcfromtimestamp(index.version / 1000)
+    return response.make_conditional(request)
 
 # Leave Application Routes
-@app.route('/leave', methods=['GET', 'POST'])
+ACTIVE_LEAVE = ('pending', 'approved')
+
+def leave_query():
+    """Leaves joined to their applicants, in the column order of ``leaves.Leave``."""
+    return db.session.query(
+        LeaveApplication.id, LeaveApplication.applicant_id, User.name, User.department,
+        LeaveApplication.start_date, LeaveApplication.end_date, LeaveApplication.status,
+        LeaveApplication.reason
+    ).join(User, User.id == LeaveApplication.applicant_id)
+
+def overlapping_leaves(query, start, end):
+    """Narrow ``query`` to pending or approved leaves sharing a day with ``start``..``end``."""
+    return query.filter(
+        LeaveApplication.status.in_(ACTIVE_LEAVE),
+        LeaveApplication.start_date <= end,
+        LeaveApplication.end_date >= start
+    )
+
+def absence_counts(start, end, departments=None):
+    """Count the students away on each day of ``start``..``end`` per department.
+    
+    Returns ``{(day, department): (approved, pending)}`` from a single query:
+    a recursive CTE lists the days and each is joined to the leaves covering
+    it through the (status, start_date, end_date) index. A student with two
+    overlapping leaves is counted once per day.
+    """
+    days = select(literal(start, db.Date).label('day')).cte('days', recursive=True)
+    days = days.union_all(select(func.date(days.c.day, '+1 day')).where(days.c.day < end))
+    def absent(status):
+        return func.count(func.distinct(case(
+            (LeaveApplication.status == status, LeaveApplication.applicant_id)
+        )))
+    query = db.session.query(
+        days.c.day, User.department, absent('approved'), absent('pending')
+    ).select_from(days).join(LeaveApplication, and_(
+        LeaveApplication.status.in_(ACTIVE_LEAVE),
+        LeaveApplication.start_date <= days.c.day,
+        LeaveApplication.end_date >= days.c.day
+    )).join(
+        User, User.id == LeaveApplication.applicant_id
+    ).filter(
+        LeaveApplication.start_date <= end,
+        LeaveApplication.end_date >= start
+    ).group_by(days.c.day, User.department)
+    if departments is not None:
+        query = query.filter(User.department.in_(departments))
+    return {(day, department): (approved, pending) for day, department, approved, pending in query}
+
+def student_departments():
+    return [department for department, in db.session.query(User.department).filter(
+        User.role == 'student', User.department.isnot(None)
+    ).distinct().order_by(User.department)]
+
+def decide_leaves(leave_ids, decision, reviewer_id):
+    """Approve or reject the pending leaves among ``leave_ids`` in one transaction.
+    
+    The status change, the applicants' notifications and the counters are
+    committed together, so either all of them land or none do. Leaves that
+    were already decided, possibly by another reviewer a moment ago, are
+    left alone. Returns the number of leaves decided.
+    """
+    status = 'approved' if decision == 'approve' else 'rejected'
+    now = datetime.now()
+    # Write first: once the UPDATE holds the write lock nobody else can decide these rows
+    LeaveApplication.query.filter(
+        LeaveApplication.id.in_(leave_ids),
+        LeaveApplication.status == 'pending'
+    ).update({'status': status, 'reviewer_id': reviewer_id, 'reviewed_at': now},
+             synchronize_session=False)
+    applicants = [applicant_id for applicant_id, in db.session.query(LeaveApplication.applicant_id).filter(
+        LeaveApplication.id.in_(leave_ids),
+        LeaveApplication.reviewer_id == reviewer_id,
+        LeaveApplication.reviewed_at == now
+    )]
+    if not applicants:
+        db.session.rollback()
+        return 0
+    
+    bump_counter('pending_leaves', -len(applicants))
+    db.session.execute(Notification.__table__.insert(), [
+        {'user_id': applicant_id, 'content': f'Your leave application has been {status}',
+         'link': url_for('dashboard'), 'is_read': False, 'created_at': now}
+        for applicant_id in applicants
+    ])
+    bump_counters('unread_notifications', applicants)
+    db.session.commit()
+    return len(applicants)
+
+@portal.route('/leave', methods=['GET', 'POST'])
 @login_required(role="student")
 def leave_application():
     if request.method == 'POST':
-        start_date = datetime.strptime(request.form.get('start_date'), '%Y-%m-%d').date()
-        end_date = datetime.strptime(request.form.get('end_date'), '%Y-%m-%d').date()
+        try:
+            start_date = datetime.strptime(request.form.get('start_date', ''), '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.form.get('end_date', ''), '%Y-%m-%d').date()
+        except ValueError:
+            flash('Please enter valid start and end dates', 'danger')
+            return redirect(url_for('leave_application'))
+        if end_date < start_date:
+            flash('The end date cannot be before the start date', 'danger')
+            return redirect(url_for('leave_application'))
+        max_days = current_app.config['LEAVE_MAX_DAYS']
+        if (end_date - start_date).days >= max_days:
+            flash(f'Leave can be at most {max_days} days long', 'danger')
+            return redirect(url_for('leave_application'))
+        window = timedelta(days=current_app.config['LEAVE_WINDOW_DAYS'])
+        if start_date < date.today() - window or end_date > date.today() + window:
+            flash(f'Leave must fall within {window.days} days of today', 'danger')
+            return redirect(url_for('leave_application'))
         reason = request.form.get('reason')
         
+        overlaps = overlapping_leaves(
+            LeaveApplication.query.filter_by(applicant_id=session['user_id']), start_date, end_date
+        ).order_by(LeaveApplication.start_date).all()
+        
         application = LeaveApplication(
             applicant_id=session['user_id'],
             start_date=start_date,
@@ -421,36 +1258,109 @@ def leave_application():
         )
         
         db.session.add(application)
+        bump_counter('pending_leaves')
         db.session.commit()
         
-        faculty = User.query.filter_by(role='faculty').all()
-        for person in faculty:
-            create_notification(
-                person.id,
-                f"New leave application from {session['user_name']}",
-                url_for('manage_leaves')
-            )
+        broadcast_notification(
+            f"New leave application from {session['user_name']}",
+            url_for('manage_leaves'),
+            role='faculty'
+        )
         
         flash('Leave application submitted successfully!', 'success')
+        if overlaps:
+            periods = ', '.join(
+                f"{leave.start_date:%b %d} to {leave.end_date:%b %d} ({leave.status})" for leave in overlaps
+            )
+            flash(f'It overlaps leave you have already applied for: {periods}', 'warning')
         return redirect(url_for('dashboard'))
     
     return render_template('leave.html')
 
-@app.route('/leave/manage')
+@portal.route('/leave/manage')
+@read_only
 @login_required(role=["faculty", "admin"])
 def manage_leaves():
-    pending_leaves = db.session.query(
-        LeaveApplication,
-        User.name
-    ).join(
-        User, LeaveApplication.applicant_id == User.id
-    ).filter(
-        LeaveApplication.status == 'pending'
-    ).all()
+    department = request.args.get('department') or None
+    page = max(request.args.get('page', 1, type=int), 1)
+    size = current_app.config['PAGE_SIZE']
+    
+    query = leave_query().filter(LeaveApplication.status == 'pending')
+    if department:
+        query = query.filter(User.department == department)
+    # Same order as the (status, start_date, end_date) index, so no sort is needed
+    rows = query.order_by(
+        LeaveApplication.start_date, LeaveApplication.end_date, LeaveApplication.id
+    ).offset((page - 1) * size).limit(size + 1).all()
+    pending = [Leave(*row) for row in rows[:size]]
+    
+    reviews = []
+    if pending:
+        start = min(leave.start_date for leave in pending)
+        end = max(leave.end_date for leave in pending)
+        others = overlapping_leaves(leave_query().filter(
+            LeaveApplication.applicant_id.in_({leave.applicant_id for leave in pending})
+        ), start, end)
+        # Absences are only counted for days students could apply for, so a
+        # leave saved before the limits existed cannot make the day list huge
+        window = timedelta(days=current_app.config['LEAVE_WINDOW_DAYS'])
+        start, end = max(start, date.today() - window), min(end, date.today() + window)
+        counts = absence_counts(start, end, {leave.department for leave in pending}) if start <= end else {}
+        reviews = review_pending(pending, [Leave(*row) for row in others], counts)
+    
+    return render_template('manage_leaves.html',
+                         reviews=reviews,
+                         department=department,
+                         departments=student_departments(),
+                         page=page,
+                         has_more=len(rows) > size)
+
+@portal.route('/leave/decisions', methods=['POST'])
+@login_required(role=["faculty", "admin"])
+def leave_decisions():
+    decision = request.form.get('decision')
+    department = request.form.get('department') or None
+    if decision not in ['approve', 'reject']:
+        flash('Invalid decision', 'danger')
+        return redirect(url_for('manage_leaves', department=department))
+    
+    leave_ids = set(request.form.getlist('leave_ids', type=int))
+    if not leave_ids:
+        flash('Select at least one leave application', 'warning')
+        return redirect(url_for('manage_leaves', department=department))
+    
+    decided = decide_leaves(leave_ids, decision, session['user_id'])
+    decision_text = "approved" if decision == 'approve' else "rejected"
+    message = f"{decided} leave application{'s' if decided != 1 else ''} {decision_text}"
+    if decided < len(leave_ids):
+        message += f"; {len(leave_ids) - decided} had already been decided"
+    flash(message, 'success' if decided else 'warning')
+    return redirect(url_for('manage_leaves', department=department))
+
+@portal.route('/leave/calendar')
+@read_only
+@login_required(role=["faculty", "admin"])
+def leave_calendar():
+    today = date.today()
+    try:
+        year, month = (int(part) for part in request.args.get('month', '').split('-'))
+        first, last = month_bounds(year, month)
+    except ValueError:
+        year, month = today.year, today.month
+        first, last = month_bounds(year, month)
+    department = request.args.get('department') or None
     
-    return render_template('manage_leaves.html', pending_leaves=pending_leaves)
+    counts = absence_counts(first, last, [department] if department else None)
+    previous_month, next_month = neighbour_months(first, last)
+    return render_template('leave_calendar.html',
+                         view=month_view(year, month, counts),
+                         department=department,
+                         departments=student_departments(),
+                         previous_month=previous_month,
+                         next_month=next_month,
+                         today=today)
 
-@app.route('/leave/decision/<int:leave_id>/<decision>')
+@portal.route('/leave/decision/<int:leave_id>/<decision>')
 @login_required(role=["faculty", "admin"])
 def leave_decision(leave_id, decision):
     leave = LeaveApplication.query.get_or_404(leave_id)
@@ -459,6 +1369,8 @@ def leave_decision(leave_id, decision):
         flash('Invalid decision', 'danger')
         return redirect(url_for('manage_leaves'))
     
+    if leave.status == 'pending':
+        bump_counter('pending_leaves', -1)
     leave.status = 'approved' if decision == 'approve' else 'rejected'
     leave.reviewer_id = session['user_id']
     leave.reviewed_at = datetime.now()
@@ -476,30 +1388,302 @@ def leave_decision(leave_id, decision):
     return redirect(url_for('manage_leaves'))
 
 # Notification Routes
-@app.route('/notifications')
+def notification_page(user):
+    """Return one page of personal and broadcast notifications merged by time.
+    
+    Each source is paged on its own ``(created_at, id)`` key, so the cursor
+    carries one key per source.
+    """
+    personal_after, broadcast_after = request_cursor(sources=2)
+    size = current_app.config['PAGE_SIZE']
+    personal = keyset_page(
+        Notification.query.filter_by(user_id=user.id),
+        Notification.created_at, Notification.id,
+        personal_after, size
+    )
+    broadcasts = keyset_page(
+        broadcasts_for(user),
+        BroadcastNotification.created_at, BroadcastNotification.id,
+        broadcast_after, size
+    )
+    merged = sorted(personal.items + broadcasts.items, key=lambda n: n.created_at, reverse=True)
+    items = merged[:size]
+    
+    next_cursor = None
+    if personal.next_key or broadcasts.next_key or len(merged) > size:
+        for notification in items:
+            if isinstance(notification, Notification):
+                personal_after = (notification.created_at, notification.id)
+            else:
+                broadcast_after = (notification.created_at, notification.id)
+        next_cursor = encode_cursor(personal_after, broadcast_after)
+    return items, next_cursor
+
+def advance_broadcast_watermark(user_id, broadcast_id, clear=False):
+    """Mark broadcasts up to ``broadcast_id`` read, and with ``clear`` stop listing them."""
+    upsert = sqlite_insert(BroadcastReceipt).values(
+        user_id=user_id, last_read_id=broadcast_id, cleared_id=broadcast_id if clear else 0
+    )
+    watermarks = {'last_read_id': func.max(BroadcastReceipt.last_read_id, upsert.excluded.last_read_id)}
+    if clear:
+        watermarks['cleared_id'] = func.max(BroadcastReceipt.cleared_id, upsert.excluded.cleared_id)
+    db.session.execute(upsert.on_conflict_do_update(
+        index_elements=[BroadcastReceipt.user_id],
+        set_=watermarks
+    ))
+
+def mark_notifications_read(user, ids=(), since=None, broadcast_id=None, everything=False):
+    """Flag notifications read in one UPDATE and return ``(updated, unread)``.
+    
+    Marks personal rows in ``ids``, rows at or newer than the ``since`` keyset
+    key, or all of them with ``everything``. Broadcasts are read by moving the
+    watermark up to ``broadcast_id`` (the newest broadcast with ``everything``).
+    """
+    conditions = []
+    if ids:
+        conditions.append(Notification.id.in_(ids))
+    if since is not None:
+        since_time, since_id = since
+        conditions.append(or_(
+            Notification.created_at > since_time,
+            and_(Notification.created_at == since_time, Notification.id >= since_id)
+        ))
+    
+    updated = 0
+    if conditions or everything:
+        query = Notification.query.filter_by(user_id=user.id, is_read=False)
+        if not everything:
+            query = query.filter(or_(*conditions))
+        updated = query.update({'is_read': True}, synchronize_session=False)
+        if updated:
+            bump_counter('unread_notifications', -updated, user.id)
+    
+    if everything:
+        broadcast_id = db.session.query(func.max(BroadcastNotification.id)).scalar()
+    if broadcast_id:
+        advance_broadcast_watermark(user.id, broadcast_id)
+    db.session.commit()
+    
+    return updated, unread_notification_count(user)
+
+def mark_page_read(user, notifications):
+    ids = [n.id for n in notifications if isinstance(n, Notification) and not n.is_read]
+    broadcast_ids = [n.id for n in notifications if isinstance(n, BroadcastNotification)]
+    mark_notifications_read(user, ids, broadcast_id=max(broadcast_ids, default=None))
+
+@portal.route('/notifications')
 @login_required(role="any")
 def notifications():
-    notifications = Notification.query.filter_by(
-        user_id=session['user_id']
-    ).order_by(
-        Notification.created_at.desc()
-    ).all()
-    
-    for notification in notifications:
-        if not notification.is_read:
-            notification.is_read = True
+    user = current_user()
+    notifications, next_cursor = notification_page(user)
+    # Render before marking read so the commit doesn't expire the page's rows
+    html = render_template('notifications.html',
+                           notifications=notifications,
+                           next_cursor=next_cursor)
+    mark_page_read(user, notifications)
+    return html
+
+@portal.route('/notifications/more')
+@login_required(role="any")
+def notifications_more():
+    user = current_user()
+    notifications, next_cursor = notification_page(user)
+    response = render_fragment('partials/notification_items.html', next_cursor,
+                               notifications=notifications)
+    mark_page_read(user, notifications)
+    return response
+
+@portal.route('/notifications/mark-read', methods=['POST'])
+@login_required(role="any")
+def mark_notifications_read_view():
+    """Mark one id, a batch of ids, everything up to a feed cursor, or all notifications read."""
+    raw_ids = request.form.getlist('notification_id')
+    raw_ids += request.form.getlist('notification_ids') + request.form.getlist('notification_ids[]')
+    try:
+        ids = [int(part) for value in raw_ids for part in value.split(',') if part.strip()]
+        broadcast_id = request.form.get('broadcast_id', type=int)
+    except ValueError:
+        abort(400)
+    
+    since = None
+    if request.form.get('cursor'):
+        try:
+            since, broadcast_since = decode_cursor(request.form['cursor'], sources=2)
+        except ValueError:
+            abort(400)
+        if broadcast_since is not None:
+            broadcast_id = db.session.query(func.max(BroadcastNotification.id)).scalar()
+    
+    everything = request.form.get('all') in ('1', 'true')
+    if not (ids or since or broadcast_id or everything):
+        abort(400)
+    
+    updated, unread = mark_notifications_read(current_user(), ids, since, broadcast_id, everything)
+    return {'updated': updated, 'unread': unread}
+
+@portal.route('/notifications/clear', methods=['POST'])
+@login_required(role="any")
+def clear_notifications():
+    user = current_user()
+    deleted = Notification.query.filter_by(user_id=user.id).delete(synchronize_session=False)
+    Counter.query.filter_by(name='unread_notifications', user_id=user.id).delete(synchronize_session=False)
+    newest = db.session.query(func.max(BroadcastNotification.id)).scalar()
+    if newest:
+        advance_broadcast_watermark(user.id, newest, clear=True)
+    db.session.commit()
+    return {'deleted': deleted}
+
+@portal.route('/notifications/count')
+@read_only
+def notification_count():
+    """The unread count behind the navbar badge, polled by scripts.js.
+    
+    Answered from the counters, so it is right whichever worker stored the
+    notification, and an unchanged count is a 304 with no body.
+    """
+    # The poll stops on 204, unlike the login redirect
+    user = current_user()
+    if user is None:
+        return Response(status=204)
+    response = make_response({'count': unread_notification_count(user)})
+    response.set_etag(str(response.json['count']))
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# User Deletion
+def rewrite_in_chunks(model, key, condition, values=None, columns=(), on_chunk=None):
+    """Delete the rows of ``model`` matching ``condition``, or set ``values`` on them.
+    
+    Works through at most USER_PURGE_CHUNK_SIZE rows per transaction, so
+    other writers get the database between chunks. ``on_chunk(rows)`` is
+    called with each chunk's ``key`` and ``columns`` before it is changed.
+    ``values`` must stop the rows matching ``condition``, or this never ends.
+    Yields the size of each committed chunk.
+    """
+    size = current_app.config['USER_PURGE_CHUNK_SIZE']
+    table = model.__table__
+    while True:
+        rows = db.session.execute(select(key, *columns).select_from(table).where(condition).limit(size)).all()
+        if not rows:
             db.session.commit()
+            return
+        if on_chunk is not None:
+            on_chunk(rows)
+        statement = table.delete() if values is None else table.update().values(**values)
+        db.session.execute(statement.where(key.in_([row[0] for row in rows])))
+        db.session.commit()
+        yield len(rows)
+
+def purge_user_group(job, user_ids, reassign_to):
+    """Remove ``user_ids`` and the rows that refer to them, one table at a time."""
+    doomed = set(user_ids)
+    rowid = literal_column('rowid')
     
-    return render_template('notifications.html', notifications=notifications)
+    def release_unread(rows):
+        # Unread messages from the departing users no longer count for whoever is left
+        unread = {}
+        for _, recipient_id, is_read in rows:
+            if not is_read and recipient_id not in doomed:
+                unread[recipient_id] = unread.get(recipient_id, 0) + 1
+        by_amount = {}
+        for recipient_id, amount in unread.items():
+            by_amount.setdefault(amount, []).append(recipient_id)
+        for amount, recipients in by_amount.items():
+            bump_counters('unread_messages', recipients, -amount)
+    
+    def release_pending(rows):
+        pending = sum(1 for _, status in rows if status == 'pending')
+        if pending:
+            bump_counter('pending_leaves', -pending)
+    
+    released = []
+    def release_files(rows):
+        released.extend(digest for _, digest in rows if digest and release_upload(digest))
+    
+    def release_accounts(rows):
+        bump_counter('users', -len(rows))
+    
+    steps = [
+        ('messages', Message, Message.id,
+         or_(Message.sender_id.in_(user_ids), Message.recipient_id.in_(user_ids)),
+         None, (Message.recipient_id, Message.is_read), release_unread),
+        ('conversations', Conversation, rowid,
+         or_(Conversation.user_id.in_(user_ids), Conversation.partner_id.in_(user_ids)), None, (), None),
+        ('notifications', Notification, Notification.id, Notification.user_id.in_(user_ids), None, (), None),
+        ('leave_applications', LeaveApplication, LeaveApplication.id, LeaveApplication.applicant_id.in_(user_ids),
+         None, (LeaveApplication.status,), release_pending),
+        ('reviewed leaves', LeaveApplication, LeaveApplication.id, LeaveApplication.reviewer_id.in_(user_ids),
+         {'reviewer_id': None}, (), None),
+        ('study_materials', StudyMaterial, StudyMaterial.id, StudyMaterial.uploaded_by.in_(user_ids),
+         None, (StudyMaterial.sha256,), release_files),
+        ('announcements', Announcement, Announcement.id, Announcement.posted_by.in_(user_ids),
+         None if reassign_to is None else {'posted_by': reassign_to}, (), None),
+        ('timetables', Timetable, Timetable.id, Timetable.faculty_id.in_(user_ids), {'faculty_id': None}, (),
+         lambda rows: touch_timetables(None, db.session.connection(), None)),
+        ('broadcast_receipts', BroadcastReceipt, BroadcastReceipt.user_id, BroadcastReceipt.user_id.in_(user_ids),
+         None, (), None),
+        ('counters', Counter, rowid, Counter.user_id.in_(user_ids), None, (), None),
+        ('users', User, User.id, User.id.in_(user_ids), None, (), release_accounts),
+    ]
+    for label, model, key, condition, values, columns, on_chunk in steps:
+        job.progress(stage=label)
+        for changed in rewrite_in_chunks(model, key, condition, values, columns, on_chunk):
+            job.count(label, changed)
+            if released:
+                delete_unreferenced_files(released)
+                released.clear()
+    for user_id in user_ids:
+        identity_cache.invalidate(user_id)
+
+def purge_users(job, user_ids, reassign_to=None):
+    """Delete users and everything that hangs off them, in bounded chunks.
+    
+    Their messages, conversations, notifications, leave applications,
+    study materials (releasing the stored files), broadcast receipts and
+    counters go with them. Their announcements are handed to
+    ``reassign_to``, or deleted when it is None; leaves they reviewed and
+    classes they teach stay, with no reviewer or teacher. Admins are
+    skipped. Runs USER_PURGE_BATCH_SIZE users per pass and commits every
+    chunk, so the site keeps working while a large purge runs.
+    """
+    user_ids = list(user_ids)
+    if reassign_to is not None and reassign_to in user_ids:
+        # Handing their announcements to one of them would match the same rows forever
+        raise ValueError('cannot reassign announcements to a user who is being deleted')
+    job.progress('starting', 0, len(user_ids))
+    purged = 0
+    for batch in chunked(user_ids, current_app.config['USER_PURGE_BATCH_SIZE']):
+        batch = [user_id for user_id, in db.session.query(User.id).filter(
+            User.id.in_(batch), User.role != 'admin'
+        )]
+        if batch:
+            purge_user_group(job, batch, reassign_to)
+        purged += len(batch)
+        job.progress(done=purged)
+    job.progress('finished')
+    return {'users': purged}
+
+def purge_candidates(role='student', department=None, joined_before=None):
+    """Ids of the non-admin users matching a bulk purge's filters."""
+    query = db.session.query(User.id).filter(User.role == role, User.role != 'admin')
+    if department:
+        query = query.filter(User.department == department)
+    if joined_before:
+        query = query.filter(User.created_at < joined_before)
+    return [user_id for user_id, in query.order_by(User.id)]
 
 # Admin Routes
-@app.route('/admin/users')
+@portal.route('/admin/users')
+@read_only
 @login_required(role="admin")
 def manage_users():
     users = User.query.all()
-    return render_template('admin/manage_users.html', users=users)
+    departments = sorted({user.department for user in users if user.department})
+    return render_template('admin/manage_users.html', users=users, departments=departments,
+                           jobs=job_runner.recent())
 
-@app.route('/admin/users/delete/<int:user_id>')
+@portal.route('/admin/users/delete/<int:user_id>')
 @login_required(role="admin")
 def delete_user(user_id):
     user = User.query.get_or_404(user_id)
@@ -508,14 +1692,246 @@ def delete_user(user_id):
         flash('Cannot delete admin users', 'danger')
         return redirect(url_for('manage_users'))
     
-    db.session.delete(user)
+    name = user.name
     db.session.commit()
+    job = job_runner.submit(f'Delete {name}', purge_users, [user_id], reassign_to=session['user_id'])
+    if job.state == 'done':
+        flash('User deleted successfully', 'success')
+    elif job.state == 'failed':
+        flash(f'Could not delete {name}: {job.error}', 'danger')
+    else:
+        flash(f'Deleting {name} in the background', 'info')
+    return redirect(url_for('manage_users'))
+
+@portal.route('/admin/users/purge', methods=['POST'])
+@login_required(role="admin")
+def purge_users_view():
+    """Bulk deletion for the end of the year, e.g. one department's graduating students."""
+    role = request.form.get('role', 'student')
+    department = request.form.get('department') or None
+    joined_before = request.form.get('joined_before')
+    try:
+        joined_before = datetime.strptime(joined_before, '%Y-%m-%d') if joined_before else None
+    except ValueError:
+        flash('Joined before must be a date', 'danger')
+        return redirect(url_for('manage_users'))
+    if role not in ('student', 'faculty') or not (department or joined_before):
+        flash('Choose a department or a join date to purge by', 'danger')
+        return redirect(url_for('manage_users'))
     
-    flash('User deleted successfully', 'success')
+    user_ids = purge_candidates(role, department, joined_before)
+    db.session.commit()
+    if not user_ids:
+        flash('No users match that purge', 'info')
+        return redirect(url_for('manage_users'))
+    job_runner.submit(f'Purge {len(user_ids)} {role} accounts', purge_users, user_ids,
+                      reassign_to=session['user_id'])
+    flash(f'Purging {len(user_ids)} users in the background', 'info')
     return redirect(url_for('manage_users'))
 
+@portal.route('/admin/jobs')
+@read_only
+@login_required(role="admin")
+def job_list():
+    return {'jobs': job_runner.recent()}
+
+@portal.route('/admin/jobs/<job_id>')
+@read_only
+@login_required(role="admin")
+def job_status(job_id):
+    job = job_runner.get(job_id)
+    if job is None:
+        abort(404)
+    return job
+
+@portal.route('/admin/dispatcher')
+@read_only
+@login_required(role="admin")
+def dispatcher_stats():
+    return dispatcher.stats()
+
+@portal.route('/metrics')
+@read_only
+def metrics():
+    """Prometheus metrics, for admins or for scrapers sending METRICS_TOKEN as a bearer token."""
+    if not request_metrics.enabled:
+        abort(404)
+    token = current_app.config['METRICS_TOKEN']
+    authorization = request.headers.get('Authorization', '')
+    if not (token and hmac.compare_digest(authorization, f'Bearer {token}')):
+        identity = current_identity()
+        if identity is None or identity[0] != 'admin':
+            abort(403)
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@portal.route('/admin/password-hasher')
+@read_only
+@login_required(role="admin")
+def password_hasher_stats():
+    return password_hasher.stats()
+
+# Command Line
+# Superseded by the (status, dates) and (applicant, dates) leave indexes
+RETIRED_INDEXES = ('ix_leave_applications_status', 'ix_leave_applications_applicant_id')
+
+def dashboard_queries(user_id=1, department='CS'):
+    """The queries behind /dashboard, for EXPLAIN QUERY PLAN reports.
+    
+    They are built by the same helpers the dashboard calls, for a student
+    ``user_id`` in ``department`` who joined today.
+    """
+    user = User(id=user_id, role='student', department=department, created_at=datetime.now())
+    return {
+        'dashboard counters': counters_for(user_id),
+        'unread broadcasts': select(func.count()).select_from(unread_broadcasts(user).subquery()),
+        'latest announcements': latest_announcements(),
+        'own materials': latest_materials(uploaded_by=user_id),
+        'recent materials': latest_materials(),
+        'timetable version': timetable_version_query(),
+    }
+
+@portal.cli.command('upgrade-db')
+def upgrade_db_command():
+    """Create missing tables, columns and indexes, then explain the dashboard queries."""
+    actions = upgrade_schema(db, RETIRED_INDEXES)
+    with db.engine.begin() as connection:
+        if install_fts(connection, StudyMaterial.__tablename__, MATERIAL_SEARCH_COLUMNS):
+            actions.append(f'created full-text index {fts_table(StudyMaterial.__tablename__)}')
+    if Message.query.first() is not None and Conversation.query.first() is None:
+        actions.append(f'built {rebuild_conversations()} conversation summaries')
+    db.session.commit()  # explain() needs the writer connection the session is holding
+    for action in actions:
+        click.echo(action)
+    if not actions:
+        click.echo('Schema is up to date')
+    
+    for name, query in dashboard_queries().items():
+        click.echo(f'\n{name}:')
+        for step in explain(db, query):
+            click.echo(f'  {step}')
+
+@portal.cli.command('reconcile-counters')
+def reconcile_counters_command():
+    """Rebuild the dashboard counters from the source tables.
+    
+    Run after upgrade-db first creates the counters table, or whenever the
+    counters may have drifted.
+    """
+    click.echo(f'Rebuilt {rebuild_counters()} counters')
+
+def provision_batch(batch, dry_run):
+    """Insert the users in ``batch`` that have no account yet, in one transaction, and return them."""
+    emails = [user['email'] for user in batch]
+    existing = {email for email, in db.session.query(User.email).filter(User.email.in_(emails))}
+    new_users = [user for user in batch if user['email'] not in existing]
+    if dry_run or not new_users:
+        db.session.rollback()
+        return new_users
+    hashes = password_hasher.hash_many(user['password'] for user in new_users)
+    now = datetime.now()
+    db.session.execute(User.__table__.insert(), [
+        dict(user, password=password_hash, created_at=now)
+        for user, password_hash in zip(new_users, hashes)
+    ])
+    bump_counter('users', len(new_users))
+    db.session.commit()
+    return new_users
+
+@portal.cli.command('import-users')
+@click.argument('source', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']),
+              help='Input format; guessed from the file extension by default.')
+@click.option('--batch-size', default=1000, show_default=True, help='Users per transaction.')
+@click.option('--dry-run', is_flag=True, help='Validate and report without writing anything.')
+def import_users_command(source, fmt, batch_size, dry_run):
+    """Create accounts in bulk from a CSV or JSON Lines file.
+    
+    Each record needs name, email, password and role; department is
+    optional. Emails that already have an account, or that repeat earlier
+    in the file, are skipped.
+    """
+    started = time.perf_counter()
+    fmt = fmt or detect_format(source.name)
+    seen = set()
+    totals = {'read': 0, 'created': 0, 'existing': 0, 'duplicate': 0, 'invalid': 0}
+    
+    def valid_users():
+        for line_number, record in read_users(source, fmt):
+            totals['read'] += 1
+            user, error = clean_user(record)
+            if error:
+                totals['invalid'] += 1
+                click.echo(f'line {line_number}: {error}', err=True)
+            elif user['email'] in seen:
+                totals['duplicate'] += 1
+            else:
+                seen.add(user['email'])
+                yield user
+    
+    for batch in chunked(valid_users(), batch_size):
+        created = len(provision_batch(batch, dry_run))
+        totals['created'] += created
+        totals['existing'] += len(batch) - created
+    
+    elapsed = time.perf_counter() - started
+    verb = 'Would create' if dry_run else 'Created'
+    click.echo(f"{verb} {totals['created']} of {totals['read']} users in {elapsed:.1f}s "
+               f"({totals['read'] / elapsed if elapsed else 0:.0f} rows/s); "
+               f"skipped {totals['existing']} existing, {totals['duplicate']} repeated "
+               f"and {totals['invalid']} invalid")
+
+@portal.cli.command('purge-users')
+@click.option('--role', type=click.Choice(['student', 'faculty']), default='student', show_default=True)
+@click.option('--department', help='Only users in this department.')
+@click.option('--joined-before', type=click.DateTime(['%Y-%m-%d']), help='Only users created before this date.')
+@click.option('--reassign-to', help='Email of the account that takes over their announcements; '
+                                    'the first admin by default.')
+@click.option('--dry-run', is_flag=True, help='Count the users that would go without deleting anything.')
+def purge_users_command(role, department, joined_before, reassign_to, dry_run):
+    """Delete a year's worth of accounts, e.g. a department's graduating students.
+    
+    Runs the same chunked pipeline as deleting one user from the admin
+    pages, printing progress as it goes.
+    """
+    if not (department or joined_before):
+        raise click.UsageError('pass --department or --joined-before; refusing to purge every account')
+    if reassign_to:
+        heir = db.session.query(User.id).filter_by(email=reassign_to).scalar()
+        if heir is None:
+            raise click.UsageError(f'no account with email {reassign_to}')
+    else:
+        heir = db.session.query(func.min(User.id)).filter_by(role='admin').scalar()
+    user_ids = purge_candidates(role, department, joined_before)
+    db.session.commit()
+    if heir in user_ids:
+        raise click.UsageError(f'{reassign_to} would be purged too; pass an account that stays')
+    if dry_run or not user_ids:
+        click.echo(f'Would delete {len(user_ids)} users')
+        return
+    
+    started = time.perf_counter()
+    job = job_runner.submit(f'Purge {len(user_ids)} {role} accounts', purge_users, user_ids, reassign_to=heir)
+    while job.state in ('queued', 'running'):
+        time.sleep(1)
+        click.echo(f'{job.done}/{job.total} users, now on {job.stage}', err=True)
+    if job.state == 'failed':
+        raise click.ClickException(f'purge failed after {job.done} users: {job.error}')
+    rows = ', '.join(f'{count} {label}' for label, count in job.counts.items())
+    click.echo(f"Deleted {job.result['users']} users in {time.perf_counter() - started:.1f}s ({rows})")
+
+@portal.cli.command('build-assets')
+def build_assets_command():
+    """Minify, fingerprint and precompress the static CSS and JS into static/dist.
+    
+    Run on every deploy; pages link to the new files as soon as the app restarts.
+    """
+    for source, output, sizes in asset_pipeline.build():
+        compressed = ', '.join(f'{encoding} {size:,}' for encoding, size in sizes.items()
+                               if encoding not in ('source', 'minified'))
+        click.echo(f"{source} -> {output}: {sizes['source']:,} bytes, minified {sizes['minified']:,}, {compressed}")
+
 # Utility Filters
-@app.template_filter('datetimeformat')
+@portal.template_filter('datetimeformat')
 def datetimeformat(value, format='%Y-%m-%d %H:%M'):
     if value is None:
         return ""
@@ -523,7 +1939,7 @@ def datetimeformat(value, format='%Y-%m-%d %H:%M'):
 
 
 # Database Management
-@app.route('/delete-db')
+@portal.route('/delete-db')
 def delete_db():
     try:
         db_path = 'instance/student_portal.db'
@@ -534,7 +1950,55 @@ def delete_db():
     except Exception as e:
         return f"Error deleting database: {str(e)}"
 
+# Application Factory
+def create_app(config=None):
+    """Build the portal from config.py, the EDUHUB_SETTINGS file if set, then ``config``.
+    
+    Nothing connects to the database until the first request, so a
+    pre-fork server can build the app once in its master process. Each
+    forked worker drops the pooled connections it inherited and opens its
+    own; ``db`` registers that fork hook once, for every app it serves.
+    Every other extension is made afresh for each app and kept in
+    ``app.extensions``, so building a second app leaves the first alone.
+    """
+    app = Flask(__name__, template_folder='templates')
+    app.config.from_object('config')
+    app.config.from_envvar('EDUHUB_SETTINGS', silent=True)
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    if app.config['TEMPLATE_CACHE_DIR']:
+        os.makedirs(app.config['TEMPLATE_CACHE_DIR'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_DIR'])
+    
+    db.init_app(app)
+    ContentStore().init_app(app)
+    notifications = NotificationDispatcher(app, db, Notification.__table__)
+    hasher = PasswordHasher(app)
+    JobRunner(app, db, BackgroundJob.__table__)
+    app.extensions['download_tracker'] = BufferedCounter(
+        app, write_download_counts, interval=app.config['DOWNLOAD_FLUSH_INTERVAL']
+    )
+    app.extensions['identity_cache'] = TTLCache(app.config['USER_CACHE_TTL'])
+    app.extensions['compiled_timetables'] = {}
+    metrics = RequestMetrics(app)
+    metrics.gauge('eduhub_notification_queue_depth', 'Fan-out jobs waiting to be written.',
+                  lambda: notifications.stats()['queue_depth'])
+    metrics.gauge('eduhub_password_hashes_rejected', 'Hashing requests turned away while the pool was full.',
+                  lambda: hasher.rejected)
+    AssetPipeline(app)
+    portal.init_app(app)
+    return app
+
+def warm_templates(app):
+    """Compile every template now, e.g. in a pre-fork master so workers share the result."""
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
-    app.run(debug=True)
\ No newline at end of file
+    # FLASK_DEBUG=1 turns on the debugger and reloader
+    app.run()
\ No newline at end of file
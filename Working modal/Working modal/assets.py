@@ -0,0 +1,125 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # optional; without it only gzip copies are built
+    brotli = None
+
+# Precompressed variants, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def minify_css(source):
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.DOTALL)
+    source = re.sub(r'\s+', ' ', source)
+    # Spaces before a colon can matter in selectors (``a :hover``), so only trim after it
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    return source.replace(';}', '}').strip()
+
+
+def minify_js(source):
+    """Drop comment-only lines, indentation and blank lines.
+
+    Line breaks are kept, so automatic semicolon insertion still sees the
+    same code; gzip and brotli take care of the rest.
+    """
+    lines = (line.strip() for line in source.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//')) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+class AssetPipeline:
+    """Fingerprinted, minified and precompressed copies of the static CSS and JS.
+
+    ``build()`` writes each asset in ``ASSETS_SOURCES`` to ``static/dist`` as
+    ``name.<hash>.ext``, along with gzip (and, when the ``brotli`` package is
+    installed, brotli) copies and a ``manifest.json``. Once a manifest exists,
+    ``url_for('static', filename='css/styles.css')`` points at the
+    fingerprinted copy, which is served with the best encoding the client
+    accepts and cached for a year as immutable. Without a manifest, the
+    source files are served as usual.
+    """
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_SOURCES', ('css/styles.css', 'js/scripts.js'))
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 60 * 60)
+        self.app = app
+        self.dist = os.path.join(app.static_folder, 'dist')
+        app.extensions['asset_pipeline'] = self
+        self.load()
+        app.url_defaults(self._fingerprint)
+        app.add_url_rule(f'{app.static_url_path}/dist/<path:filename>', 'asset', self.serve)
+
+    def load(self):
+        try:
+            with open(os.path.join(self.dist, 'manifest.json')) as f:
+                self.manifest = json.load(f)
+        except FileNotFoundError:
+            self.manifest = {}
+        return self.manifest
+
+    def build(self):
+        """Rebuild every asset; returns ``[(source, output, sizes)]`` for reporting.
+
+        Earlier builds are left in place, so pages still cached by browsers
+        or proxies keep working during and after a deploy.
+        """
+        os.makedirs(self.dist, exist_ok=True)
+        manifest, report = {}, []
+        for source in self.app.config['ASSETS_SOURCES']:
+            with open(os.path.join(self.app.static_folder, source), encoding='utf-8') as f:
+                original = f.read()
+            stem, ext = os.path.splitext(os.path.basename(source))
+            minified = MINIFIERS.get(ext, lambda text: text)(original).encode('utf-8')
+            name = f'{stem}.{hashlib.sha256(minified).hexdigest()[:12]}{ext}'
+            sizes = {'source': len(original.encode('utf-8')), 'minified': len(minified)}
+            variants = {'': minified, '.gz': gzip.compress(minified, 9, mtime=0)}
+            if brotli is not None:
+                variants['.br'] = brotli.compress(minified, quality=11)
+            for suffix, data in variants.items():
+                with open(os.path.join(self.dist, name + suffix), 'wb') as f:
+                    f.write(data)
+                if suffix:
+                    sizes[suffix[1:]] = len(data)
+            manifest[source] = f'dist/{name}'
+            report.append((source, manifest[source], sizes))
+
+        with open(os.path.join(self.dist, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        self.manifest = manifest
+        return report
+
+    def serve(self, filename):
+        options = {'mimetype': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+                   'max_age': self.app.config['ASSETS_MAX_AGE']}
+        accepted = request.accept_encodings
+        for encoding, suffix in ENCODINGS:
+            if accepted[encoding] and os.path.exists(os.path.join(self.dist, filename + suffix)):
+                response = send_from_directory(self.dist, filename + suffix, **options)
+                response.headers['Content-Encoding'] = encoding
+                break
+        else:
+            response = send_from_directory(self.dist, filename, **options)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    def _fingerprint(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.manifest:
+            values['filename'] = self.manifest[values['filename']]
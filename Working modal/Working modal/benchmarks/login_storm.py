@@ -0,0 +1,118 @@
+"""Measure how a burst of logins affects the rest of the site.
+
+Starts the app on a local threaded server against a scratch database, then
+has ``--clients`` threads post logins as fast as they can, pausing
+``--backoff`` seconds after a 503. One probe thread keeps loading a page
+that needs no password work. Runs once with hashing inline in the request
+threads (the old behaviour) and once on the PasswordHasher process pool.
+
+    python benchmarks/login_storm.py --clients 32 --seconds 10
+"""
+import argparse
+import http.client
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+directory = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directory, 'bench.db')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.serving import make_server
+
+from app import User, create_app, db
+
+app = create_app()
+password_hasher = app.extensions['password_hasher']
+
+LOGIN = urlencode({'email': 'storm@example.com', 'password': 'storm-password'})
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return float('nan')
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def request(port, method, path, body=None):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'} if body else {}
+    started = time.perf_counter()
+    connection.request(method, path, body, headers)
+    status = connection.getresponse().status
+    connection.close()
+    return status, (time.perf_counter() - started) * 1000
+
+
+def storm(port, args):
+    deadline = time.perf_counter() + args.seconds
+    results = {'logins': 0, 'busy': 0, 'login_ms': [], 'probe_ms': []}
+    lock = threading.Lock()
+
+    def client():
+        while time.perf_counter() < deadline:
+            status, elapsed = request(port, 'POST', '/login', LOGIN)
+            with lock:
+                if status != 503:
+                    results['logins'] += 1
+                    results['login_ms'].append(elapsed)
+                    continue
+                results['busy'] += 1
+            time.sleep(args.backoff)
+
+    def probe():
+        while time.perf_counter() < deadline:
+            results['probe_ms'].append(request(port, 'GET', '/login')[1])
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=client) for _ in range(args.clients)]
+    threads.append(threading.Thread(target=probe))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--backoff', type=float, default=1, help='seconds a client waits after a 503')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(name='Storm', email='storm@example.com', role='student', department='CS',
+                            password=password_hasher.hash('storm-password')))
+        db.session.commit()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f'{args.clients} clients, {args.seconds:g}s each, '
+          f"{app.config['PASSWORD_HASH_WORKERS']} hash workers, queue {app.config['PASSWORD_HASH_QUEUE']}")
+    for name, inline in (('inline', True), ('pool', False)):
+        app.config['PASSWORD_HASH_SYNC'] = inline
+        # Inline hashing has no pool to bound, so let every request through
+        password_hasher._slots = threading.BoundedSemaphore(
+            args.clients if inline else app.config['PASSWORD_HASH_QUEUE']
+        )
+        results = storm(server.port, args)
+        print(f"{name:<7} logins/s {results['logins'] / args.seconds:>6.1f}   "
+              f"503s {results['busy']:>5}   "
+              f"login p50 {percentile(results['login_ms'], 0.5):>6.0f}ms   "
+              f"other page p50 {percentile(results['probe_ms'], 0.5):>5.0f}ms "
+              f"p95 {percentile(results['probe_ms'], 0.95):>5.0f}ms")
+    server.shutdown()
+    password_hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
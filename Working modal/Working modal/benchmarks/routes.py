@@ -0,0 +1,224 @@
+"""Benchmark the main routes through Flask's test client.
+
+Runs against DATABASE_URL, which benchmarks/seed.py can fill. It logs in
+as the first admin, the faculty member with the most messages and the
+student with the most notifications. Each route is requested
+``--requests`` times, optionally from ``--concurrency`` threads at once.
+For every route it reports latency percentiles, SQL statements per
+request, rows handed to templates and response bytes. The
+new_announcement route really posts, so use a scratch database. Results
+are written as JSON; pass an earlier file to ``--compare`` to see what
+changed.
+
+    python benchmarks/routes.py --requests 200 --concurrency 4 --compare results/before.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flask.templating
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+
+from app import Message, Notification, User, create_app, db
+
+app = create_app()
+
+ROUTES = [
+    # (name, role, method, path, form)
+    ('dashboard (student)', 'student', 'GET', '/dashboard', None),
+    ('dashboard (faculty)', 'faculty', 'GET', '/dashboard', None),
+    ('dashboard (admin)', 'admin', 'GET', '/dashboard', None),
+    ('announcements', 'student', 'GET', '/announcements', None),
+    ('materials', 'student', 'GET', '/materials', None),
+    ('materials search', 'student', 'GET', '/materials/search?q=lecture', None),
+    ('notifications', 'student', 'GET', '/notifications', None),
+    ('chat (student)', 'student', 'GET', '/chat', None),
+    ('chat (faculty)', 'faculty', 'GET', '/chat', None),
+    ('manage_leaves', 'faculty', 'GET', '/leave/manage', None),
+    ('leave_calendar', 'faculty', 'GET', '/leave/calendar', None),
+    ('timetable', 'student', 'GET', '/timetable', None),
+    ('new_announcement', 'faculty', 'POST', '/announcements/new',
+     {'title': 'Benchmark announcement', 'content': 'Posted by benchmarks/routes.py'}),
+]
+
+tracking = threading.local()
+FLASK_GLOBALS = {'config', 'request', 'session', 'g'}
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    if getattr(tracking, 'active', False):
+        tracking.queries += 1
+
+
+original_render = flask.templating._render
+
+
+def counting_render(template, context, app):
+    # Rows are the lengths of the sequences a view passes in, not Flask's own globals
+    if getattr(tracking, 'active', False):
+        tracking.rows += sum(len(value) for key, value in context.items()
+                             if key not in FLASK_GLOBALS and isinstance(value, (list, tuple, dict)))
+    return original_render(template, context, app)
+
+
+flask.templating._render = counting_render
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return round(samples[min(len(samples) - 1, int(len(samples) * fraction))], 2)
+
+
+def login(client, user_id):
+    user = db.session.get(User, user_id)
+    with client.session_transaction() as session:
+        session.update(user_id=user.id, user_role=user.role, user_name=user.name)
+
+
+def busiest_users():
+    """The first admin, the faculty member with most messages and the student with most notifications."""
+    admin = db.session.query(func.min(User.id)).filter_by(role='admin').scalar()
+    faculty = db.session.query(Message.recipient_id).join(User, User.id == Message.recipient_id).filter(
+        User.role == 'faculty'
+    ).group_by(Message.recipient_id).order_by(func.count().desc()).limit(1).scalar()
+    student = db.session.query(Notification.user_id).join(User, User.id == Notification.user_id).filter(
+        User.role == 'student'
+    ).group_by(Notification.user_id).order_by(func.count().desc()).limit(1).scalar()
+    return {'admin': admin, 'faculty': faculty, 'student': student}
+
+
+def measure(user_id, method, path, form):
+    client = app.test_client()
+    with app.app_context():
+        login(client, user_id)
+    tracking.active, tracking.queries, tracking.rows = True, 0, 0
+    started = time.perf_counter()
+    try:
+        response = client.open(path, method=method, data=form)
+        elapsed = (time.perf_counter() - started) * 1000
+        return elapsed, response.status_code, len(response.get_data()), tracking.queries, tracking.rows
+    finally:
+        tracking.active = False
+
+
+def bench_route(route, users, args):
+    name, role, method, path, form = route
+    if users[role] is None:
+        return None
+    for _ in range(args.warmup):
+        measure(users[role], method, path, form)
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        samples = list(pool.map(lambda _: measure(users[role], method, path, form), range(args.requests)))
+    times = [sample[0] for sample in samples]
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample[1])] = statuses.get(str(sample[1]), 0) + 1
+    return {
+        'method': method,
+        'path': path,
+        'role': role,
+        'requests': len(samples),
+        'p50_ms': percentile(times, 0.50),
+        'p95_ms': percentile(times, 0.95),
+        'p99_ms': percentile(times, 0.99),
+        'mean_ms': round(sum(times) / len(times), 2),
+        'queries_per_request': round(sum(sample[3] for sample in samples) / len(samples), 2),
+        'rows_rendered': round(sum(sample[4] for sample in samples) / len(samples), 2),
+        'bytes': round(sum(sample[2] for sample in samples) / len(samples)),
+        'statuses': statuses,
+    }
+
+
+def table_sizes():
+    sizes = {}
+    for table in db.metadata.sorted_tables:
+        sizes[table.name] = db.session.query(func.count()).select_from(table).scalar()
+    return sizes
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(results, path):
+    with open(path) as f:
+        before = json.load(f)['routes']
+    print(f'\nChange against {path} (p95, queries):')
+    for name, now in results.items():
+        then = before.get(name)
+        if not then:
+            continue
+        change = (now['p95_ms'] - then['p95_ms']) / then['p95_ms'] * 100 if then['p95_ms'] else 0
+        print(f"  {name:<22} {then['p95_ms']:>8.1f} -> {now['p95_ms']:>8.1f}ms ({change:+.0f}%)   "
+              f"{then['queries_per_request']:g} -> {now['queries_per_request']:g} queries")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100, help='Requests per route.')
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--routes', help='Comma-separated route names to run; all by default.')
+    parser.add_argument('--output', help='Where to write the JSON results '
+                                         '(default: benchmarks/results/<timestamp>.json).')
+    parser.add_argument('--compare', help='An earlier results file to compare against.')
+    args = parser.parse_args()
+
+    app.config['NOTIFICATION_DISPATCH_SYNC'] = True
+    selected = set(args.routes.split(',')) if args.routes else None
+    with app.app_context():
+        users = busiest_users()
+        sizes = table_sizes()
+
+    results = {}
+    print(f"{'route':<22} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8} {'rows':>8} {'bytes':>9}")
+    for route in ROUTES:
+        if selected and route[0] not in selected:
+            continue
+        result = bench_route(route, users, args)
+        if result is None:
+            print(f'{route[0]:<22} skipped: no {route[1]} in the database')
+            continue
+        results[route[0]] = result
+        print(f"{route[0]:<22} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} "
+              f"{result['queries_per_request']:>8g} {result['rows_rendered']:>8g} {result['bytes']:>9}")
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'],
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'tables': sizes,
+        },
+        'routes': results,
+    }
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                          datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nWrote {output}')
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Fill the database with synthetic users, messages, notifications and so on.
+
+Writes to DATABASE_URL (student_portal.db by default) in large batched
+inserts, then rebuilds the derived tables: counters, conversation
+summaries and the timetable version. Every seeded account's password is
+``password``. The data is reproducible for a given ``--seed``.
+
+    DATABASE_URL=sqlite:////tmp/load.db python benchmarks/seed.py \\
+        --users 20000 --notifications 2000000 --messages 500000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (Announcement, BroadcastNotification, LeaveApplication, Message, Notification, StudyMaterial,
+                 Timetable, User, create_app, db, password_hasher, rebuild_conversations, rebuild_counters,
+                 touch_timetables)
+from dispatcher import chunked
+from schedule import DEFAULT_SLOTS, WEEKDAYS
+
+DEPARTMENTS = ('CS', 'EE', 'ME', 'CE', 'Math', 'Physics', 'Chemistry', 'Biology')
+SUBJECTS = ('Algorithms', 'Databases', 'Networks', 'Circuits', 'Thermodynamics', 'Statics',
+            'Linear Algebra', 'Calculus', 'Quantum Mechanics', 'Organic Chemistry', 'Genetics')
+WORDS = ('exam', 'assignment', 'lecture', 'notes', 'deadline', 'lab', 'project', 'schedule', 'room',
+         'grade', 'review', 'submission', 'chapter', 'quiz', 'tutorial', 'office', 'hours', 'week')
+FILE_TYPES = ('Lecture Notes', 'Assignment', 'Reference Material', 'Exam Paper')
+
+
+class Seeder:
+    def __init__(self, args):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.now = datetime.now()
+        self.inserted = {}
+
+    def sentence(self, words=8):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+    def moment(self, days=365):
+        return self.now - timedelta(seconds=self.random.randrange(days * 24 * 3600))
+
+    def insert(self, model, rows):
+        table = model.__table__
+        started = time.perf_counter()
+        count = 0
+        for chunk in chunked(rows, self.args.batch_size):
+            db.session.execute(table.insert(), chunk)
+            db.session.commit()
+            count += len(chunk)
+        elapsed = time.perf_counter() - started
+        self.inserted[table.name] = count
+        print(f'{table.name:<24} {count:>9} rows in {elapsed:6.1f}s ({count / elapsed if elapsed else 0:,.0f} rows/s)')
+
+    def users(self):
+        password = password_hasher.hash('password')
+        roles = ['admin'] * 1 + ['faculty'] * 6 + ['student'] * 93
+        for number in range(self.args.users):
+            role = 'admin' if number == 0 else self.random.choice(roles)
+            yield {'name': f'{role.title()} {number}', 'email': f'{role}{number}@example.edu',
+                   'password': password, 'role': role, 'department': self.random.choice(DEPARTMENTS),
+                   'created_at': self.moment(730)}
+
+    def run(self):
+        self.insert(User, self.users())
+        ids = {role: [user_id for user_id, in db.session.query(User.id).filter_by(role=role)]
+               for role in ('admin', 'faculty', 'student')}
+        staff = ids['faculty'] + ids['admin']
+        everyone = staff + ids['student']
+        pick = self.random.choice
+        args = self.args
+
+        self.insert(Announcement, (
+            {'title': self.sentence(4), 'content': self.sentence(40), 'posted_by': pick(staff),
+             'created_at': self.moment(), 'is_urgent': self.random.random() < 0.05}
+            for _ in range(args.announcements)
+        ))
+        self.insert(StudyMaterial, (
+            {'title': self.sentence(3), 'filename': f'material-{number}.pdf', 'description': self.sentence(20),
+             'uploaded_by': pick(staff), 'uploaded_at': self.moment(), 'subject': pick(SUBJECTS),
+             'file_type': pick(FILE_TYPES), 'file_size': self.random.randrange(10_000, 5_000_000),
+             'mime_type': 'application/pdf', 'download_count': self.random.randrange(200)}
+            for number in range(args.materials)
+        ))
+
+        def leave():
+            start = date.today() + timedelta(days=self.random.randrange(-120, 60))
+            status = pick(('pending', 'approved', 'approved', 'rejected'))
+            return {'applicant_id': pick(ids['student']), 'start_date': start,
+                    'end_date': start + timedelta(days=self.random.randrange(5)), 'reason': self.sentence(12),
+                    'status': status, 'reviewer_id': None if status == 'pending' else pick(staff),
+                    'reviewed_at': None if status == 'pending' else self.moment(120)}
+        self.insert(LeaveApplication, (leave() for _ in range(args.leaves)))
+
+        def message():
+            student, teacher = pick(ids['student']), pick(staff)
+            sender, recipient = (student, teacher) if self.random.random() < 0.6 else (teacher, student)
+            return {'content': self.sentence(self.random.randrange(3, 30)), 'sender_id': sender,
+                    'recipient_id': recipient, 'sent_at': self.moment(),
+                    'is_read': self.random.random() < 0.8}
+        self.insert(Message, (message() for _ in range(args.messages)))
+
+        self.insert(Notification, (
+            {'user_id': pick(everyone), 'content': self.sentence(6), 'link': '/announcements',
+             'is_read': self.random.random() < 0.7, 'created_at': self.moment()}
+            for _ in range(args.notifications)
+        ))
+        self.insert(BroadcastNotification, (
+            {'content': self.sentence(6), 'link': '/announcements', 'created_at': self.moment(),
+             'role': pick((None, 'student', 'faculty')), 'department': pick((None,) + DEPARTMENTS)}
+            for _ in range(args.broadcasts)
+        ))
+        self.insert(Timetable, (
+            {'day': day, 'time_slot': slot, 'subject': pick(SUBJECTS), 'faculty_id': pick(ids['faculty'] or staff),
+             'classroom': f'Room {self.random.randrange(100, 140)}', 'department': department}
+            for department in DEPARTMENTS for day in WEEKDAYS for slot in DEFAULT_SLOTS
+            if self.random.random() < 0.8
+        ))
+
+        started = time.perf_counter()
+        touch_timetables(None, db.session.connection(), None)
+        counters = rebuild_counters()
+        conversations = rebuild_conversations()
+        print(f'Rebuilt {counters} counters and {conversations} conversations '
+              f'in {time.perf_counter() - started:.1f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--announcements', type=int, default=2000)
+    parser.add_argument('--materials', type=int, default=5000)
+    parser.add_argument('--leaves', type=int, default=5000)
+    parser.add_argument('--messages', type=int, default=50000)
+    parser.add_argument('--notifications', type=int, default=200000)
+    parser.add_argument('--broadcasts', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--reset', action='store_true', help='Drop and recreate every table first.')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        print(f"Seeding {app.config['SQLALCHEMY_DATABASE_URI']}")
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        if User.query.first() is not None:
+            parser.error('the database already has users; pass --reset to replace them')
+        started = time.perf_counter()
+        Seeder(args).run()
+        print(f'Done in {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Compare the legacy SQLite setup with the engine profile from config.py.
+
+Runs the same mixed workload twice against a scratch database: reader
+threads run the unread-notification count the navbar polls for, writer
+threads insert notifications and commit one at a time, as
+create_notification does. "locked errors" are writes or reads that gave up
+after the busy timeout; "pool timeouts" waited as long for a connection.
+
+    python benchmarks/sqlite_profile.py --readers 16 --writers 4 --seconds 10
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError, TimeoutError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from sqlite_engine import engine_options, install_pragmas
+
+SETUP = [
+    'CREATE TABLE notification (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, '
+    'content TEXT NOT NULL, is_read BOOLEAN NOT NULL DEFAULT 0, created_at DATETIME)',
+    'CREATE INDEX ix_notification_user_unread ON notification (user_id, is_read, created_at)',
+]
+READ = text('SELECT count(*) FROM notification WHERE user_id = :user_id AND is_read = 0')
+WRITE = text("INSERT INTO notification (user_id, content, created_at) "
+             "VALUES (:user_id, 'benchmark', datetime('now'))")
+
+
+def profile_config(uri):
+    settings = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    settings['SQLALCHEMY_DATABASE_URI'] = uri
+    return settings
+
+
+def legacy_engines(uri, settings):
+    engine = create_engine(uri)
+    return engine, engine
+
+
+def profile_engines(uri, settings):
+    writer = create_engine(uri, **engine_options(settings))
+    install_pragmas(writer, settings)
+    reader_options = engine_options(settings)
+    reader_options['pool_size'] = settings['SQLITE_READ_POOL_SIZE']
+    reader = create_engine(uri, **reader_options)
+    install_pragmas(reader, settings, read_only=True)
+    return reader, writer
+
+
+def run(name, make_engines, args):
+    directory = tempfile.mkdtemp()
+    uri = 'sqlite:///' + os.path.join(directory, 'bench.db')
+    settings = profile_config(uri)
+    reader, writer = make_engines(uri, settings)
+    with writer.begin() as connection:
+        for statement in SETUP:
+            connection.execute(text(statement))
+
+    counts = {'reads': 0, 'writes': 0, 'locked': 0, 'timeouts': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def work(engine, statement, key, seed):
+        done = locked = timeouts = 0
+        user_id = seed
+        while time.perf_counter() < deadline:
+            user_id = user_id % args.users + 1
+            try:
+                with engine.begin() as connection:
+                    connection.execute(statement, {'user_id': user_id})
+                done += 1
+            except OperationalError as exc:
+                if 'locked' not in str(exc):
+                    raise
+                locked += 1
+            except TimeoutError:
+                timeouts += 1
+        with lock:
+            counts[key] += done
+            counts['locked'] += locked
+            counts['timeouts'] += timeouts
+
+    threads = [threading.Thread(target=work, args=(reader, READ, 'reads', i)) for i in range(args.readers)]
+    threads += [threading.Thread(target=work, args=(writer, WRITE, 'writes', i)) for i in range(args.writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    reader.dispose()
+    writer.dispose()
+    shutil.rmtree(directory)
+
+    print(f"{name:<8} reads/s {counts['reads'] / args.seconds:>9.0f}   "
+          f"writes/s {counts['writes'] / args.seconds:>7.0f}   "
+          f"locked errors {counts['locked']}   pool timeouts {counts['timeouts']}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--users', type=int, default=500)
+    args = parser.parse_args()
+
+    print(f'{args.readers} readers, {args.writers} writers, {args.seconds:g}s each')
+    legacy = run('legacy', legacy_engines, args)
+    profile = run('profile', profile_engines, args)
+    for key in ('reads', 'writes'):
+        if legacy[key]:
+            print(f'{key}: {profile[key] / legacy[key]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Measure how long the app takes to start and to compile its templates.
+
+Every measurement runs in a fresh interpreter: importing app.py, building
+the app with create_app, compiling every template and serving the first
+request. Templates are compiled twice per size, first with an empty
+bytecode cache (the first start after a deploy) and then with the cache
+that run filled (every later restart). ``--copies`` repeats the template
+folder to show how both grow as templates are added.
+
+    python benchmarks/startup.py --copies 1,4,16
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(templates, cache_dir, database):
+    """Runs in the child interpreter; prints one JSON line of timings in milliseconds."""
+    started = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    import app as portal
+    imported = time.perf_counter()
+    app = portal.create_app({'TEMPLATE_CACHE_DIR': cache_dir, 'SQLALCHEMY_DATABASE_URI': database})
+    created = time.perf_counter()
+
+    from jinja2 import FileSystemLoader
+    app.jinja_env.loader = FileSystemLoader(templates)
+    count = portal.warm_templates(app)
+    compiled = time.perf_counter()
+
+    status = app.test_client().get('/login').status_code
+    served = time.perf_counter()
+    print(json.dumps({
+        'import_ms': (imported - started) * 1000,
+        'create_app_ms': (created - imported) * 1000,
+        'templates': count,
+        'compile_ms': (compiled - created) * 1000,
+        'first_request_ms': (served - compiled) * 1000,
+        'status': status,
+    }))
+
+
+def template_folder(directory, copies):
+    """The real templates plus ``copies - 1`` renamed copies of them."""
+    folder = os.path.join(directory, f'templates-{copies}')
+    shutil.copytree(os.path.join(ROOT, 'templates'), folder)
+    for number in range(1, copies):
+        shutil.copytree(os.path.join(ROOT, 'templates'), os.path.join(folder, f'copy{number}'))
+    return folder
+
+
+def run_child(templates, cache_dir, database):
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', templates, cache_dir, database],
+        capture_output=True, text=True, check=True, cwd=ROOT
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - started) * 1000
+    return result
+
+
+def main():
+    if len(sys.argv) == 5 and sys.argv[1] == '--child':
+        measure(*sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--copies', default='1,4,16',
+                        help='Comma-separated multiples of the template folder to measure.')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    database = 'sqlite:///' + os.path.join(directory, 'startup.db')
+    print(f"{'templates':>9} {'cache':>6} {'import':>8} {'create':>8} {'compile':>9} "
+          f"{'per tmpl':>9} {'1st req':>8} {'process':>9}")
+    try:
+        for copies in [int(value) for value in args.copies.split(',')]:
+            templates = template_folder(directory, copies)
+            cache_dir = os.path.join(directory, f'cache-{copies}')
+            for cache in ('cold', 'warm'):
+                result = run_child(templates, cache_dir, database)
+                print(f"{result['templates']:>9} {cache:>6} {result['import_ms']:>7.0f}ms "
+                      f"{result['create_app_ms']:>7.1f}ms {result['compile_ms']:>8.0f}ms "
+                      f"{result['compile_ms'] / result['templates']:>7.2f}ms "
+                      f"{result['first_request_ms']:>7.1f}ms {result['process_ms']:>8.0f}ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,71 @@
 import os
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
 # Secret key for session management
-SECRET_KEY = 'your-secret-key-here'
+SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 
 # Database configuration
-SQLALCHEMY_DATABASE_URI = 'sqlite:///student_portal.db'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///student_portal.db')
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+# Server processes sharing this machine's CPUs; gunicorn.conf.py sets it for its workers
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+# Worker threads per gunicorn process; gunicorn.conf.py reads the same variable
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', 8))
+
+# SQLite engine profile, applied to every connection of a file database
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # milliseconds
+SQLITE_CACHE_SIZE = -64000  # negative means KiB, so about 64MB per connection
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+# Every SELECT reads here, so one per request thread plus a few for background work; 0 sends reads to the writer
+SQLITE_READ_POOL_SIZE = int(os.environ.get('SQLITE_READ_POOL_SIZE', WORKER_THREADS + 4))
+SQLITE_WRITE_POOL_SIZE = 1
+
+# Password hashing, done on a pool of worker processes in each server process
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')  # older hashes are upgraded at login
+PASSWORD_SALT_LENGTH = 16
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', max((os.cpu_count() or 1) // WEB_CONCURRENCY, 1)))
+PASSWORD_HASH_QUEUE = 4 * PASSWORD_HASH_WORKERS  # logins beyond this get a 503
+PASSWORD_HASH_TIMEOUT = 10  # seconds
+
+# Request metrics, served in Prometheus format at /metrics
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # lets a scraper read /metrics without an admin login
+METRICS_N_PLUS_ONE_THRESHOLD = 5  # same statement this many times in one request
+METRICS_SLOW_QUERY_MS = 100
+# Where each server process leaves its figures for /metrics to add up; gunicorn.conf.py sets it
+METRICS_DIR = os.environ.get('METRICS_DIR')
+
 # File upload settings
 ALLOWED_EXTENSIONS = {'pdf', 'doc', 'docx', 'ppt', 'pptx', 'xls', 'xlsx', 'txt', 'jpg', 'png', 'zip'}
-MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
\ No newline at end of file
+MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
+UPLOAD_FOLDER = os.path.join(BASE_DIR, 'static', 'uploads')
+UPLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_CACHE_MAX_AGE = 24 * 60 * 60
+# URL prefix of an nginx ``internal`` location aliased to UPLOAD_FOLDER; when
+# set, downloads are handed to nginx with X-Accel-Redirect. Set
+# USE_X_SENDFILE instead for Apache/lighttpd.
+ACCEL_REDIRECT_PREFIX = None
+DOWNLOAD_FLUSH_INTERVAL = 30
+
+# How often open pages ask /notifications/count for the badge; hidden tabs skip their turn
+NOTIFICATION_POLL_SECONDS = int(os.environ.get('NOTIFICATION_POLL_SECONDS', 30))
+
+# Pages and caches
+PAGE_SIZE = 20
+CHAT_HISTORY = 50  # messages loaded when a chat thread is opened
+USER_CACHE_TTL = 0  # seconds to cache role/department per user; 0 disables
+
+# Leave applications
+LEAVE_MAX_DAYS = 60  # longest leave a student can apply for, inclusive of both ends
+LEAVE_WINDOW_DAYS = 365  # leave must start and end within this many days of today
+
+# User deletion
+USER_PURGE_BATCH_SIZE = 500  # users deleted per pass
+USER_PURGE_CHUNK_SIZE = 2000  # rows deleted or updated per transaction
+
+# Compiled templates are cached here between restarts; None compiles them afresh each start
+TEMPLATE_CACHE_DIR = os.environ.get('TEMPLATE_CACHE_DIR', os.path.join(BASE_DIR, 'instance', 'template-cache'))
\ No newline at end of file
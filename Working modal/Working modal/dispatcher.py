@@ -0,0 +1,151 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from itertools import islice
+
+logger = logging.getLogger(__name__)
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class NotificationDispatcher:
+    """Writes notification fan-out jobs in batched inserts off the request path.
+
+    A job is a callable that yields row dicts for ``table``. It runs inside an
+    application context on a single worker thread, and its rows are inserted
+    ``NOTIFICATION_BATCH_SIZE`` at a time with one commit per chunk. A job's
+    ``on_batch`` callback runs inside each chunk's transaction. With
+    ``NOTIFICATION_DISPATCH_SYNC`` set (the default when testing) jobs run
+    inline in the calling thread instead. Jobs still queued when the process
+    exits are written by ``drain``, registered with atexit, so a restart
+    does not lose notifications for requests that already returned.
+    """
+
+    def __init__(self, app=None, db=None, table=None):
+        self.db = db
+        self.table = table
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._batch_times = deque(maxlen=100)
+        self.jobs_processed = 0
+        self.jobs_failed = 0
+        self.rows_written = 0
+        if app is not None:
+            self.init_app(app, db, table)
+
+    def init_app(self, app, db, table):
+        app.config.setdefault('NOTIFICATION_DISPATCH_SYNC', app.testing)
+        app.config.setdefault('NOTIFICATION_BATCH_SIZE', 1000)
+        self.app = app
+        self.db = db
+        self.table = table
+        app.extensions['notification_dispatcher'] = self
+        atexit.register(self.drain)
+
+    @property
+    def batch_size(self):
+        return self.app.config['NOTIFICATION_BATCH_SIZE']
+
+    def submit(self, rows, on_batch=None):
+        """Queue ``rows``, a callable returning the rows to insert.
+
+        ``on_batch(chunk)`` is called with each chunk before it is committed.
+        """
+        if self.app.config['NOTIFICATION_DISPATCH_SYNC']:
+            self._run(rows, on_batch)
+            return
+        self._ensure_worker()
+        self._queue.put((rows, on_batch))
+
+    def join(self):
+        """Block until every queued job has been written."""
+        self._queue.join()
+
+    def drain(self):
+        """Write every queued job now, in the calling thread, for a clean shutdown.
+
+        Returns how many jobs were taken off the queue. A job the worker
+        thread has already started is waited for.
+        """
+        drained = 0
+        while True:
+            try:
+                rows, on_batch = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._process(rows, on_batch)
+            drained += 1
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.join()
+        return drained
+
+    def stats(self):
+        timings = list(self._batch_times)
+        return {
+            'queue_depth': self._queue.qsize(),
+            'jobs_processed': self.jobs_processed,
+            'jobs_failed': self.jobs_failed,
+            'rows_written': self.rows_written,
+            'batches': len(timings),
+            'last_batch_ms': round(timings[-1], 2) if timings else None,
+            'avg_batch_ms': round(sum(timings) / len(timings), 2) if timings else None,
+            'max_batch_ms': round(max(timings), 2) if timings else None,
+        }
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._work, name='notification-dispatcher', daemon=True
+                )
+                self._worker.start()
+
+    def _work(self):
+        while True:
+            rows, on_batch = self._queue.get()
+            self._process(rows, on_batch)
+
+    def _process(self, rows, on_batch):
+        try:
+            with self.app.app_context():
+                self._run(rows, on_batch)
+        except Exception:
+            self.jobs_failed += 1
+            logger.exception('Notification job failed')
+        finally:
+            self._queue.task_done()
+
+    def _run(self, rows, on_batch=None):
+        session = self.db.session
+        insert = self.table.insert()
+        written = 0
+        started = time.perf_counter()
+        try:
+            for chunk in chunked(rows(), self.batch_size):
+                batch_started = time.perf_counter()
+                session.execute(insert, chunk)
+                if on_batch is not None:
+                    on_batch(chunk)
+                session.commit()
+                self._batch_times.append((time.perf_counter() - batch_started) * 1000)
+                written += len(chunk)
+        except Exception:
+            session.rollback()
+            raise
+        self.jobs_processed += 1
+        self.rows_written += written
+        logger.info(
+            'Wrote %d notifications in %.1f ms (queue depth %d)',
+            written, (time.perf_counter() - started) * 1000, self._queue.qsize()
+        )
@@ -0,0 +1,43 @@
+"""Gunicorn settings for serving the portal in production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+``kill -HUP <master>`` replaces the workers gracefully: in-flight requests
+finish within ``graceful_timeout`` while new workers take over. Because the
+app is preloaded, new code needs a new master: send ``USR2``, then ``TERM``
+to the old one once the new workers are up.
+"""
+import multiprocessing
+import os
+import shutil
+
+bind = os.environ.get('BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+# The preloaded app sizes its per-worker password pools from this (config.py)
+os.environ['WEB_CONCURRENCY'] = str(workers)
+# Workers leave their request metrics here so /metrics can add them all up
+os.environ.setdefault('METRICS_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'metrics'))
+worker_class = 'gthread'
+threads = int(os.environ.get('WORKER_THREADS', 8))
+preload_app = True
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+accesslog = os.environ.get('ACCESS_LOG', '-')
+
+
+def on_starting(server):
+    # Figures from a previous server run would be counted again
+    shutil.rmtree(os.environ['METRICS_DIR'], ignore_errors=True)
+
+
+def post_fork(server, worker):
+    # Database connections are reset by db's fork hook (sqlite_engine.py); this is just for the log
+    server.log.info('Worker %s forked from the preloaded app', worker.pid)
+
+
+def worker_exit(server, worker):
+    # Write the notifications queued by requests this worker already answered
+    drained = worker.wsgi.extensions['notification_dispatcher'].drain()
+    if drained:
+        server.log.info('Worker %s wrote %d queued notification jobs before exiting', worker.pid, drained)
@@ -0,0 +1,201 @@
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """A unit of background work and its progress, as reported by the job itself."""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex[:12]
+        self.name = name
+        self.state = 'queued'  # queued, running, done, failed
+        self.stage = None
+        self.done = 0
+        self.total = None
+        self.counts = {}
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.on_change = None
+
+    def progress(self, stage=None, done=None, total=None):
+        if stage is not None:
+            self.stage = stage
+        if done is not None:
+            self.done = done
+        if total is not None:
+            self.total = total
+        self._changed()
+
+    def count(self, key, amount):
+        """Add ``amount`` to the running tally ``key``, e.g. rows deleted from a table."""
+        self.counts[key] = self.counts.get(key, 0) + amount
+        self._changed()
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change(self)
+
+    def to_dict(self):
+        finished = self.finished_at or time.time()
+        return {
+            'id': self.id,
+            'name': self.name,
+            'state': self.state,
+            'stage': self.stage,
+            'done': self.done,
+            'total': self.total,
+            'percent': round(self.done * 100 / self.total, 1) if self.total else None,
+            'counts': dict(self.counts),
+            'result': self.result,
+            'error': self.error,
+            'elapsed_s': round(finished - self.started_at, 2) if self.started_at else None,
+        }
+
+
+class JobRunner:
+    """Runs long maintenance jobs one at a time on a background thread.
+
+    ``submit(name, work, *args)`` queues ``work(job, *args)`` to run inside an
+    application context and returns the Job straight away; ``work`` reports
+    progress through ``job.progress`` and its return value becomes
+    ``job.result``. With ``JOBS_SYNC`` set (the default when testing) jobs
+    run inline in the calling thread instead.
+
+    Each job's ``to_dict()`` is also written to ``table``, so ``get`` and
+    ``recent`` see jobs run by any server process, not just this one.
+    Progress is written with the job's own transactions, at most every
+    ``JOBS_SAVE_INTERVAL`` seconds; the last ``JOBS_HISTORY`` jobs are kept.
+    A job whose process died is left showing its last saved progress.
+    """
+
+    def __init__(self, app=None, db=None, table=None):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._jobs = OrderedDict()
+        self._saved_at = {}
+        if app is not None:
+            self.init_app(app, db, table)
+
+    def init_app(self, app, db, table):
+        app.config.setdefault('JOBS_SYNC', app.testing)
+        app.config.setdefault('JOBS_HISTORY', 50)
+        app.config.setdefault('JOBS_SAVE_INTERVAL', 1.0)
+        self.app = app
+        self.db = db
+        self.table = table
+        app.extensions['job_runner'] = self
+
+    def submit(self, name, work, *args, **kwargs):
+        """Queue ``work``; commits the caller's session along with the new job's row."""
+        job = Job(name)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.app.config['JOBS_HISTORY']:
+                self._jobs.popitem(last=False)
+        self._insert(job)
+        job.on_change = self._progressed
+        if self.app.config['JOBS_SYNC']:
+            self._run(job, work, args, kwargs)
+        else:
+            self._ensure_worker()
+            self._queue.put((job, work, args, kwargs))
+        return job
+
+    def get(self, job_id):
+        """The ``to_dict()`` of job ``job_id``, or None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        snapshot = self.db.session.execute(
+            self.table.select().with_only_columns(self.table.c.snapshot).where(self.table.c.id == job_id)
+        ).scalar()
+        return json.loads(snapshot) if snapshot else None
+
+    def recent(self):
+        """The ``to_dict()`` of every job still in the history, newest first."""
+        rows = self.db.session.execute(
+            self.table.select().with_only_columns(self.table.c.id, self.table.c.snapshot)
+            .order_by(self.table.c.created_at.desc()).limit(self.app.config['JOBS_HISTORY'])
+        ).all()
+        with self._lock:
+            live = dict(self._jobs)
+        # Jobs of this process are read live rather than from their last save
+        return [live[job_id].to_dict() if job_id in live else json.loads(snapshot)
+                for job_id, snapshot in rows]
+
+    def join(self):
+        """Block until every queued job has finished."""
+        self._queue.join()
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, name='job-runner', daemon=True)
+                self._worker.start()
+
+    def _work(self):
+        while True:
+            job, work, args, kwargs = self._queue.get()
+            try:
+                with self.app.app_context():
+                    self._run(job, work, args, kwargs)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job, work, args, kwargs):
+        job.state = 'running'
+        job.started_at = time.time()
+        self._save(job, commit=True)
+        try:
+            job.result = work(job, *args, **kwargs)
+            job.state = 'done'
+        except Exception as error:
+            self.db.session.rollback()
+            job.state = 'failed'
+            job.error = str(error)
+            logger.exception('Job %s (%s) failed', job.id, job.name)
+        finally:
+            job.finished_at = time.time()
+            self._save(job, commit=True)
+            self._saved_at.pop(job.id, None)
+
+    def _insert(self, job):
+        session = self.db.session
+        session.execute(self.table.insert().values(
+            id=job.id, name=job.name, state=job.state,
+            snapshot=json.dumps(job.to_dict()), created_at=datetime.now()
+        ))
+        keep = self.table.select().with_only_columns(self.table.c.id).order_by(
+            self.table.c.created_at.desc()
+        ).limit(self.app.config['JOBS_HISTORY'])
+        session.execute(self.table.delete().where(self.table.c.id.not_in(keep.scalar_subquery())))
+        session.commit()
+
+    def _progressed(self, job):
+        if job.state != 'running':
+            return
+        if time.monotonic() - self._saved_at.get(job.id, 0) >= self.app.config['JOBS_SAVE_INTERVAL']:
+            # Rides along with the job's next commit
+            self._save(job)
+
+    def _save(self, job, commit=False):
+        session = self.db.session
+        session.execute(self.table.update().where(self.table.c.id == job.id).values(
+            state=job.state, snapshot=json.dumps(job.to_dict())
+        ))
+        if commit:
+            session.commit()
+        self._saved_at[job.id] = time.monotonic()
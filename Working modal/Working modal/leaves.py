@@ -0,0 +1,125 @@
+import calendar
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+from datetime import MAXYEAR, MINYEAR, date, timedelta
+
+Leave = namedtuple('Leave', 'id applicant_id applicant_name department start_date end_date status reason')
+Review = namedtuple('Review', 'leave overlaps peak_absent')
+Day = namedtuple('Day', 'date in_month approved pending')
+MonthView = namedtuple('MonthView', 'first last weeks departments peak')
+
+# The calendar pads months out to whole weeks, which would run past date's
+# range in the very first and last months it can represent
+FIRST_YEAR, LAST_YEAR = MINYEAR + 1, MAXYEAR - 1
+
+
+class LeaveIndex:
+    """Leave periods grouped by student, for overlap lookups.
+
+    Each student's leaves are sorted by start date alongside the latest end
+    date seen so far. A lookup bisects to the last leave starting on or
+    before the range's end and walks back only while an earlier leave can
+    still reach the range's start, so it touches the matches plus a few
+    neighbours instead of every leave the student has taken. Dates are
+    inclusive on both ends.
+    """
+
+    def __init__(self, leaves):
+        by_applicant = defaultdict(list)
+        for leave in leaves:
+            by_applicant[leave.applicant_id].append(leave)
+        self._leaves = {}
+        self._starts = {}
+        self._reach = {}
+        for applicant_id, rows in by_applicant.items():
+            rows.sort(key=lambda leave: (leave.start_date, leave.id))
+            reach, latest = [], date.min
+            for leave in rows:
+                latest = max(latest, leave.end_date)
+                reach.append(latest)
+            self._leaves[applicant_id] = rows
+            self._starts[applicant_id] = [leave.start_date for leave in rows]
+            self._reach[applicant_id] = reach
+
+    def overlapping(self, applicant_id, start, end, exclude=None):
+        """Leaves of ``applicant_id`` sharing at least one day with ``start``..``end``."""
+        rows = self._leaves.get(applicant_id, ())
+        if not rows:
+            return []
+        reach = self._reach[applicant_id]
+        found = []
+        position = bisect_right(self._starts[applicant_id], end) - 1
+        while position >= 0 and reach[position] >= start:
+            leave = rows[position]
+            if leave.end_date >= start and leave.id != exclude:
+                found.append(leave)
+            position -= 1
+        found.reverse()
+        return found
+
+
+def peak_absent(counts, department, start, end):
+    """The most students of ``department`` already away on any day of ``start``..``end``.
+
+    ``counts`` maps ``(day, department)`` to ``(approved, pending)`` as
+    returned by ``absence_counts`` in app.py. Only the days in ``counts``
+    are looked at, so a leave running far past the counted days costs no
+    more than a short one.
+    """
+    return max((
+        approved for (day, name), (approved, _) in counts.items()
+        if name == department and start <= day <= end
+    ), default=0)
+
+
+def review_pending(pending, others, counts):
+    """Pair every pending leave with the same student's overlapping leaves and
+    the peak number of approved absences in their department over its dates."""
+    index = LeaveIndex(others)
+    return [
+        Review(
+            leave,
+            index.overlapping(leave.applicant_id, leave.start_date, leave.end_date, exclude=leave.id),
+            peak_absent(counts, leave.department, leave.start_date, leave.end_date)
+        )
+        for leave in pending
+    ]
+
+
+def month_bounds(year, month):
+    if not FIRST_YEAR <= year <= LAST_YEAR:
+        raise ValueError(f'year {year} is outside the calendar')
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def neighbour_months(first, last):
+    """``YYYY-MM`` of the months either side of ``first``..``last``, None past the calendar's range."""
+    previous, following = first - timedelta(days=1), last + timedelta(days=1)
+    return (
+        f'{previous:%Y-%m}' if previous.year >= FIRST_YEAR else None,
+        f'{following:%Y-%m}' if following.year <= LAST_YEAR else None
+    )
+
+
+def month_view(year, month, counts):
+    """Lay ``counts`` out as a Monday-first month calendar.
+
+    Each day carries ``{department: count}`` for approved and for pending
+    leave. Days from the neighbouring months fill out the first and last
+    weeks but carry no counts.
+    """
+    first, last = month_bounds(year, month)
+    approved, pending = defaultdict(dict), defaultdict(dict)
+    departments = set()
+    for (day, name), (approved_count, pending_count) in counts.items():
+        departments.add(name)
+        if approved_count:
+            approved[day][name] = approved_count
+        if pending_count:
+            pending[day][name] = pending_count
+    weeks = [
+        [Day(day, first <= day <= last, approved.get(day, {}), pending.get(day, {})) for day in week]
+        for week in calendar.Calendar().monthdatescalendar(year, month)
+    ]
+    peak = max((sum(day.approved.values()) for week in weeks for day in week), default=0)
+    return MonthView(first, last, weeks, sorted(name for name in departments if name), peak)
@@ -0,0 +1,301 @@
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import current_app, g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = defaultdict(lambda: [[0] * len(buckets), 0, 0.0])
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            counts, _, _ = series = self._series[label_values]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def blank(self):
+        return Histogram(self.name, self.help, self.labels, self.buckets)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), list(counts), count, total]
+                    for labels, (counts, count, total) in self._series.items()]
+
+    def add(self, snapshot):
+        with self._lock:
+            for labels, counts, count, total in snapshot:
+                series = self._series[tuple(labels)]
+                series[0] = [mine + theirs for mine, theirs in zip(series[0], counts)]
+                series[1] += count
+                series[2] += total
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, (list(counts), count, total))
+                            for labels, (counts, count, total) in self._series.items())
+        for label_values, (counts, count, total) in series:
+            labels = format_labels(self.labels, label_values)
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] += amount
+
+    def blank(self):
+        return CounterMetric(self.name, self.help, self.labels)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(labels), value] for labels, value in self._values.items()]
+
+    def add(self, snapshot):
+        with self._lock:
+            for labels, value in snapshot:
+                self._values[tuple(labels)] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f'{self.name}{{{format_labels(self.labels, label_values)}}} {value}')
+        return lines
+
+
+def format_labels(names, values):
+    return ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class TimedTemplate(Template):
+    """Adds the time spent rendering top-level templates to the current request."""
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            state = current_state()
+            if state is not None:
+                state['render'] += time.perf_counter() - started
+
+
+def current_state():
+    if not has_request_context():
+        return None
+    return g.get('_request_metrics')
+
+
+class RequestMetrics:
+    """Per-endpoint latency, SQL and template-rendering metrics in Prometheus format.
+
+    With ``METRICS_ENABLED`` off nothing is hooked, so requests pay nothing.
+    When on, every request records its total time, time spent in SQL and in
+    rendering, and its statement count. A request that runs the same
+    statement ``METRICS_N_PLUS_ONE_THRESHOLD`` times or more is counted as a
+    likely N+1 and logged once per endpoint and statement, and so is any
+    statement slower than ``METRICS_SLOW_QUERY_MS``.
+
+    Each process keeps its own figures. With ``METRICS_DIR`` set, every
+    process writes them to ``<pid>.json`` there at most every
+    ``METRICS_SAVE_INTERVAL`` seconds, and ``render`` adds up every file, so
+    a scrape sees all of a server's workers whichever one answers it.
+    Gauges are read from the answering process only.
+    """
+
+    def __init__(self, app=None):
+        self.gauges = []
+        self._reported = set()
+        self._reported_lock = threading.Lock()
+        self.duration = Histogram('eduhub_request_duration_seconds', 'Time to produce a response.',
+                                  ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.sql_time = Histogram('eduhub_request_sql_seconds', 'Time spent running SQL per request.',
+                                  ('endpoint',), LATENCY_BUCKETS)
+        self.render_time = Histogram('eduhub_request_render_seconds', 'Time spent rendering templates per request.',
+                                     ('endpoint',), LATENCY_BUCKETS)
+        self.queries = Histogram('eduhub_request_queries', 'SQL statements run per request.',
+                                 ('endpoint',), QUERY_BUCKETS)
+        self.requests = CounterMetric('eduhub_requests_total', 'Responses by endpoint and status.',
+                                      ('endpoint', 'method', 'status'))
+        self.n_plus_one = CounterMetric('eduhub_n_plus_one_total',
+                                        'Requests that repeated one SQL statement many times.', ('endpoint',))
+        self.slow_queries = CounterMetric('eduhub_slow_queries_total',
+                                          'Statements slower than METRICS_SLOW_QUERY_MS.', ('endpoint',))
+        self.metrics = (self.requests, self.duration, self.sql_time, self.render_time, self.queries,
+                        self.n_plus_one, self.slow_queries)
+        self._saved_at = 0.0
+        self._save_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', False)
+        app.config.setdefault('METRICS_N_PLUS_ONE_THRESHOLD', 5)
+        app.config.setdefault('METRICS_SLOW_QUERY_MS', 100)
+        app.config.setdefault('METRICS_TOKEN', None)
+        app.config.setdefault('METRICS_DIR', None)
+        app.config.setdefault('METRICS_SAVE_INTERVAL', 5)
+        self.app = app
+        app.extensions['request_metrics'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+
+        app.jinja_env.template_class = TimedTemplate
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        # One pair of listeners for every app; each statement is charged to the request running it
+        if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+
+    @property
+    def enabled(self):
+        return self.app.config['METRICS_ENABLED']
+
+    def gauge(self, name, help, read):
+        """Report ``read()`` as a gauge on every scrape."""
+        self.gauges.append((name, help, read))
+
+    def render(self):
+        metrics = self.metrics
+        if self.app.config['METRICS_DIR']:
+            self.save()
+            metrics = self.combined()
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for name, help, read in self.gauges:
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} gauge', f'{name} {read()}']
+        return '\n'.join(lines) + '\n'
+
+    def save(self):
+        """Write this process's figures to METRICS_DIR for whichever worker is scraped."""
+        directory = self.app.config['METRICS_DIR']
+        with self._save_lock:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f'{os.getpid()}.json')
+            with open(path + '.tmp', 'w') as f:
+                json.dump({metric.name: metric.snapshot() for metric in self.metrics}, f)
+            os.replace(path + '.tmp', path)
+            self._saved_at = time.monotonic()
+
+    def combined(self):
+        """Every process's figures added up, from the files in METRICS_DIR."""
+        combined = [metric.blank() for metric in self.metrics]
+        by_name = {metric.name: metric for metric in combined}
+        for path in glob.glob(os.path.join(self.app.config['METRICS_DIR'], '*.json')):
+            try:
+                with open(path) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue  # a worker that died mid-write; its next file will be whole
+            for name, series in snapshot.items():
+                if name in by_name:
+                    by_name[name].add(series)
+        return combined
+
+    def _start(self):
+        g._request_metrics = {'started': time.perf_counter(), 'sql': 0.0, 'render': 0.0,
+                              'statements': Counter()}
+
+    def _finish(self, response):
+        state = g.pop('_request_metrics', None)
+        if state is None:
+            return response
+        endpoint = request.endpoint or 'unknown'
+        total = time.perf_counter() - state['started']
+        statements = state['statements']
+        count = sum(statements.values())
+
+        self.requests.inc((endpoint, request.method, str(response.status_code)))
+        self.duration.observe((endpoint, request.method), total)
+        self.sql_time.observe((endpoint,), state['sql'])
+        self.render_time.observe((endpoint,), state['render'])
+        self.queries.observe((endpoint,), count)
+
+        if statements:
+            statement, repeats = statements.most_common(1)[0]
+            if repeats >= self.app.config['METRICS_N_PLUS_ONE_THRESHOLD']:
+                self.n_plus_one.inc((endpoint,))
+                self._report_once(endpoint, statement, repeats)
+
+        response.headers['Server-Timing'] = (
+            f"sql;dur={state['sql'] * 1000:.1f}, render;dur={state['render'] * 1000:.1f}, "
+            f'total;dur={total * 1000:.1f}'
+        )
+        if (self.app.config['METRICS_DIR'] and
+                time.monotonic() - self._saved_at >= self.app.config['METRICS_SAVE_INTERVAL']):
+            self.save()
+        return response
+
+    def _report_once(self, endpoint, statement, repeats):
+        with self._reported_lock:
+            if (endpoint, statement) in self._reported:
+                return
+            self._reported.add((endpoint, statement))
+        logger.warning('Possible N+1 in %s: ran %d times in one request: %s',
+                       endpoint, repeats, one_line(statement))
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_state() is not None:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    state = current_state()
+    if state is None or not conn.info.get('query_started'):
+        return
+    # Only cursor.execute is timed; SQLite produces later rows as they are fetched
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    state['sql'] += elapsed
+    state['statements'][statement] += 1
+    if elapsed * 1000 >= current_app.config['METRICS_SLOW_QUERY_MS']:
+        endpoint = request.endpoint or 'unknown'
+        current_app.extensions['request_metrics'].slow_queries.inc((endpoint,))
+        logger.warning('Slow query in %s (%.0fms): %s', endpoint, elapsed * 1000, one_line(statement))
+
+
+def one_line(statement):
+    return re.sub(r'\s+', ' ', statement).strip()
@@ -0,0 +1,54 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+
+Page = namedtuple('Page', 'items next_key')
+
+
+def keyset_page(query, time_column, id_column, after=None, limit=20, key=None):
+    """Return the ``limit`` rows of ``query`` that sort after ``after``, newest first.
+
+    Rows are ordered by ``(time_column, id_column)`` descending and ``after``
+    is the ``(time, id)`` key of the last row already shown, so each page is
+    an index range scan however deep the history goes. ``key`` extracts that
+    pair from a result row; by default it reads the two columns by name.
+    ``next_key`` is None on the last page.
+    """
+    if after is not None:
+        after_time, after_id = after
+        # The plain range comes first so SQLite walks the index in order
+        # instead of splitting the OR into two lookups and sorting the union
+        query = query.filter(time_column <= after_time, or_(
+            time_column < after_time,
+            and_(time_column == after_time, id_column < after_id)
+        ))
+    rows = query.order_by(time_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return Page(rows, None)
+    rows = rows[:limit]
+    if key is None:
+        key = lambda row: (getattr(row, time_column.key), getattr(row, id_column.key))
+    return Page(rows, key(rows[-1]))
+
+
+def encode_cursor(*keys):
+    """Pack one ``(time, id)`` key (or None) per paged source into an opaque token."""
+    payload = [None if key is None else [key[0].isoformat(), key[1]] for key in keys]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, sources=1):
+    """Unpack a token from ``encode_cursor``; raises ValueError when it is malformed."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if len(payload) != sources:
+            raise ValueError('wrong number of cursor keys')
+        return [
+            None if key is None else (datetime.fromisoformat(key[0]), int(key[1]))
+            for key in payload
+        ]
+    except (TypeError, IndexError, KeyError, AttributeError) as exc:
+        raise ValueError(f'invalid cursor: {token!r}') from exc
@@ -0,0 +1,183 @@
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool is full or a job outlives PASSWORD_HASH_TIMEOUT."""
+
+
+def normalise_method(method):
+    """Spell out the iteration count werkzeug would fill in for a bare ``pbkdf2`` method."""
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2' and len(parts) < 3:
+        digest = parts[1] if len(parts) > 1 else 'sha256'
+        parts = ['pbkdf2', digest, str(DEFAULT_PBKDF2_ITERATIONS)]
+    return ':'.join(parts)
+
+
+def needs_rehash(pwhash, method, salt_length):
+    if pwhash.count('$') < 2:
+        return True
+    used, salt, _ = pwhash.split('$', 2)
+    return used != method or len(salt) < salt_length
+
+
+def _hash(password, method, salt_length):
+    return generate_password_hash(password, method=method, salt_length=salt_length)
+
+
+def _verify(pwhash, password, method, salt_length):
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if needs_rehash(pwhash, method, salt_length):
+        return True, _hash(password, method, salt_length)
+    return True, None
+
+
+class PasswordHasher:
+    """Hashes and checks passwords on a bounded pool of worker processes.
+
+    Key stretching is pure CPU, so running it in request threads lets a burst
+    of logins starve every other route. Here at most
+    ``PASSWORD_HASH_WORKERS`` hashes run at once and at most
+    ``PASSWORD_HASH_QUEUE`` may be in flight; beyond that :class:`HasherBusy`
+    is raised so the view can answer 503 straight away. With
+    ``PASSWORD_HASH_SYNC`` set (the default when testing) hashing runs
+    inline instead.
+    """
+
+    def __init__(self, app=None):
+        self._executor = None
+        self._pid = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._timings = deque(maxlen=100)
+        self.completed = 0
+        self.rejected = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PASSWORD_HASH_METHOD', f'pbkdf2:sha256:{DEFAULT_PBKDF2_ITERATIONS}')
+        app.config.setdefault('PASSWORD_SALT_LENGTH', 16)
+        # Every server process has its own pool, so they split the CPUs between them
+        app.config.setdefault('PASSWORD_HASH_WORKERS',
+                              max((os.cpu_count() or 1) // app.config.get('WEB_CONCURRENCY', 1), 1))
+        app.config.setdefault('PASSWORD_HASH_QUEUE', 4 * app.config['PASSWORD_HASH_WORKERS'])
+        app.config.setdefault('PASSWORD_HASH_TIMEOUT', 10)
+        app.config.setdefault('PASSWORD_HASH_SYNC', app.testing)
+        self.app = app
+        self._slots = threading.BoundedSemaphore(app.config['PASSWORD_HASH_QUEUE'])
+        app.extensions['password_hasher'] = self
+
+    @property
+    def method(self):
+        return normalise_method(self.app.config['PASSWORD_HASH_METHOD'])
+
+    @property
+    def salt_length(self):
+        return self.app.config['PASSWORD_SALT_LENGTH']
+
+    def hash(self, password):
+        return self._call(_hash, password, self.method, self.salt_length)
+
+    def hash_many(self, passwords):
+        """Hash a batch of passwords across the whole pool, for bulk imports.
+
+        Unlike :meth:`hash` this is not limited by PASSWORD_HASH_QUEUE, so
+        keep it out of request handlers.
+        """
+        passwords = list(passwords)
+        hash_one = partial(_hash, method=self.method, salt_length=self.salt_length)
+        if self.app.config['PASSWORD_HASH_SYNC'] or not passwords:
+            return [hash_one(password) for password in passwords]
+        workers = self.app.config['PASSWORD_HASH_WORKERS']
+        chunksize = max(1, len(passwords) // (workers * 4))
+        return list(self._get_executor().map(hash_one, passwords, chunksize=chunksize))
+
+    def verify(self, pwhash, password):
+        """Check ``password``; returns ``(ok, new_hash)``.
+
+        ``new_hash`` is set when the password matched but ``pwhash`` was made
+        with older parameters, and should replace the stored hash.
+        """
+        return self._call(_verify, pwhash, password, self.method, self.salt_length)
+
+    def needs_rehash(self, pwhash):
+        return needs_rehash(pwhash, self.method, self.salt_length)
+
+    def stats(self):
+        timings = list(self._timings)
+        return {
+            'workers': self.app.config['PASSWORD_HASH_WORKERS'],
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'avg_ms': round(sum(timings) / len(timings), 2) if timings else None,
+            'max_ms': round(max(timings), 2) if timings else None,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _call(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HasherBusy()
+        started = time.perf_counter()
+        if self.app.config['PASSWORD_HASH_SYNC']:
+            try:
+                result = fn(*args)
+            finally:
+                self._slots.release()
+        else:
+            try:
+                future = self._get_executor().submit(fn, *args)
+            except BaseException:
+                self._slots.release()
+                raise
+            # The slot is freed when the hash ends, not when the caller gives up on it:
+            # cancel() cannot stop a running hash, and it must keep counting against the queue
+            future.add_done_callback(lambda _: self._slots.release())
+            try:
+                result = future.result(timeout=self.app.config['PASSWORD_HASH_TIMEOUT'])
+            except TimeoutError:
+                future.cancel()
+                self.rejected += 1
+                raise HasherBusy()
+        self._timings.append((time.perf_counter() - started) * 1000)
+        self.completed += 1
+        return result
+
+    def _get_executor(self):
+        # A forked server worker must not reuse its parent's pool
+        if self._executor is not None and self._pid == os.getpid():
+            return self._executor
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    self.app.config['PASSWORD_HASH_WORKERS'], mp_context=pool_context()
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+
+def pool_context():
+    """Start pool processes without forking the request worker.
+
+    A fork copies whatever locks other request threads hold at that moment
+    (logging, the connection pools), and a child that needs one of them
+    hangs. forkserver forks from a clean single-threaded server instead;
+    spawn is the fallback where forkserver is unavailable.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
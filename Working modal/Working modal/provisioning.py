@@ -0,0 +1,49 @@
+import csv
+import json
+import os
+
+FIELDS = ('name', 'email', 'password', 'role', 'department')
+REQUIRED = ('name', 'email', 'password', 'role')
+ROLES = ('student', 'faculty', 'admin')
+
+
+def detect_format(path):
+    return 'jsonl' if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson') else 'csv'
+
+
+def read_users(stream, fmt):
+    """Yield ``(line_number, record)`` for each user in a CSV or JSON Lines stream.
+
+    CSV files need a header row naming the columns. A line that cannot be
+    parsed is yielded with a record of None.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+def clean_user(record):
+    """Return ``(user, error)``: a dict of stripped ``FIELDS`` or why the record is unusable."""
+    if record is None:
+        return None, 'could not be parsed'
+    user = {field: str(record.get(field) or '').strip() for field in FIELDS}
+    missing = [field for field in REQUIRED if not user[field]]
+    if missing:
+        return None, f"missing {', '.join(missing)}"
+    user['role'] = user['role'].lower()
+    if user['role'] not in ROLES:
+        return None, f"invalid role {user['role']!r}"
+    if '@' not in user['email']:
+        return None, f"invalid email {user['email']!r}"
+    user['department'] = user['department'] or None
+    return user, None
@@ -0,0 +1,55 @@
+from flask import current_app
+from flask.cli import AppGroup
+from werkzeug.local import LocalProxy
+
+
+class Registry:
+    """Collects views, request hooks, template filters and CLI commands for an app factory.
+
+    The decorators mirror Flask's (``route``, ``before_request``,
+    ``template_filter``, ``cli.command``) but only record what they
+    decorate; ``init_app`` installs it all on the app being built. Unlike a
+    blueprint nothing is namespaced, so endpoints keep their plain names
+    and ``url_for('login')`` works unchanged.
+    """
+
+    def __init__(self):
+        self.cli = AppGroup()
+        self._setup = []
+
+    def route(self, rule, **options):
+        def decorator(view):
+            endpoint = options.pop('endpoint', view.__name__)
+            self._setup.append(lambda app: app.add_url_rule(rule, endpoint, view, **options))
+            return view
+        return decorator
+
+    def before_request(self, hook):
+        self._setup.append(lambda app: app.before_request(hook))
+        return hook
+
+    def after_request(self, hook):
+        self._setup.append(lambda app: app.after_request(hook))
+        return hook
+
+    def template_filter(self, name=None):
+        def decorator(function):
+            self._setup.append(lambda app: app.add_template_filter(function, name))
+            return function
+        return decorator
+
+    def init_app(self, app):
+        for setup in self._setup:
+            setup(app)
+        for command in self.cli.commands.values():
+            app.cli.add_command(command)
+
+
+def extension(name):
+    """A module-level name for the current app's ``app.extensions[name]``.
+
+    The factory gives every app its own extension objects, so two apps never
+    share config, connections or background threads; this proxy finds the
+    one belonging to the app in context.
+    """
+    return LocalProxy(lambda: current_app.extensions[name])
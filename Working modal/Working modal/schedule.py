@@ -0,0 +1,120 @@
+import hashlib
+import re
+from collections import defaultdict, namedtuple
+from itertools import combinations
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday')
+WEEKEND = ('Saturday', 'Sunday')
+DEFAULT_SLOTS = ('9:00 - 10:30', '10:45 - 12:15', '1:00 - 2:30', '2:45 - 4:15')
+
+Entry = namedtuple('Entry', 'id day time_slot subject classroom department faculty_id faculty_name')
+Grid = namedtuple('Grid', 'days rows count etag')
+Conflict = namedtuple('Conflict', 'kind day first second')
+
+TIME = re.compile(r'(\d{1,2})(?:[:.](\d{2}))?\s*([ap]\.?m\.?)?', re.IGNORECASE)
+
+
+def _minutes(match):
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if meridiem:
+        hour = hour % 12 + (12 if meridiem[0].lower() == 'p' else 0)
+    elif hour < 8:
+        # Slots are written without am/pm, and nothing is taught before 8
+        hour += 12
+    return hour * 60 + minute
+
+
+def slot_bounds(slot):
+    """Parse ``'9:00 - 10:30'`` into ``(540, 630)`` minutes; None if it is not a time range."""
+    matches = list(TIME.finditer(slot or ''))
+    if len(matches) < 2:
+        return None
+    start, end = _minutes(matches[0]), _minutes(matches[1])
+    if end <= start:
+        end += 12 * 60
+    return start, end
+
+
+def slot_sort_key(slot):
+    bounds = slot_bounds(slot)
+    return (0, bounds, slot) if bounds else (1, (0, 0), slot)
+
+
+def compile_grid(entries):
+    """Arrange ``entries`` into a weekly grid: ``rows`` is ``[(slot, [cell per day])]``.
+
+    Weekdays and the default slots are always present so the layout stays
+    put; weekend days and other slots appear when something is booked in
+    them. Each cell is a list of entries sorted by subject.
+    """
+    cells = defaultdict(list)
+    for entry in entries:
+        cells[entry.day, entry.time_slot].append(entry)
+    booked_days = {entry.day for entry in entries}
+    days = list(WEEKDAYS) + [day for day in WEEKEND if day in booked_days]
+    days += sorted(booked_days - set(days))
+    slots = sorted(set(DEFAULT_SLOTS) | {entry.time_slot for entry in entries}, key=slot_sort_key)
+    rows = [
+        (slot, [sorted(cells.get((day, slot), []), key=lambda entry: entry.subject) for day in days])
+        for slot in slots
+    ]
+    digest = hashlib.sha1(repr((days, rows)).encode()).hexdigest()
+    return Grid(days, rows, len(entries), digest)
+
+
+def find_conflicts(entries):
+    """Find bookings on the same day whose times overlap and that share a room,
+    a teacher or a department.
+
+    Slots are compared as time ranges, so ``'9:00 - 10:30'`` clashes with
+    ``'10:00 - 11:00'``. Slots that cannot be parsed only clash with the
+    identical slot string.
+    """
+    by_day = defaultdict(list)
+    for entry in entries:
+        by_day[entry.day].append(entry)
+
+    conflicts = []
+    for day, bookings in by_day.items():
+        pairs = []
+        timed = sorted(
+            ((slot_bounds(entry.time_slot), entry) for entry in bookings if slot_bounds(entry.time_slot)),
+            key=lambda booking: (booking[0], booking[1].id)
+        )
+        active = []
+        for (start, end), entry in timed:
+            active = [(other_end, other) for other_end, other in active if other_end > start]
+            pairs.extend((other, entry) for _, other in active)
+            active.append((end, entry))
+        untimed = defaultdict(list)
+        for entry in bookings:
+            if not slot_bounds(entry.time_slot):
+                untimed[entry.time_slot].append(entry)
+        for group in untimed.values():
+            pairs.extend(combinations(group, 2))
+
+        for first, second in pairs:
+            if first.classroom and first.classroom == second.classroom:
+                conflicts.append(Conflict('room', day, first, second))
+            if first.faculty_id and first.faculty_id == second.faculty_id:
+                conflicts.append(Conflict('faculty', day, first, second))
+            if first.department and first.department == second.department:
+                conflicts.append(Conflict('department', day, first, second))
+    return conflicts
+
+
+class TimetableIndex:
+    """Every department's compiled grid plus the conflicts, for one timetable version."""
+
+    def __init__(self, version, entries):
+        self.version = version
+        by_department = defaultdict(list)
+        for entry in entries:
+            by_department[entry.department].append(entry)
+        self.grids = {department: compile_grid(rows) for department, rows in by_department.items()}
+        self.everything = compile_grid(entries)
+        self.conflicts = find_conflicts(entries)
+        self._empty = compile_grid([])
+
+    def grid_for(self, department):
+        return self.grids.get(department, self._empty)
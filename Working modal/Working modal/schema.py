@@ -0,0 +1,58 @@
+from sqlalchemy import inspect
+
+
+def upgrade_schema(db, retired_indexes=()):
+    """Bring an existing database up to the models without recreating it.
+
+    ``db.create_all`` only creates missing tables, so columns and indexes
+    added to existing models are applied here. SQLite cannot add a NOT NULL
+    column without a default, so such columns are added as nullable.
+    ``retired_indexes`` names indexes the models no longer declare, usually
+    because a wider one replaced them; they are dropped where they exist.
+    Returns a list of human-readable actions taken.
+    """
+    engine = db.engine
+    with engine.connect() as connection:
+        tables = set(inspect(connection).get_table_names())
+    db.create_all()
+    actions = [
+        f'created table {table.name}' for table in db.metadata.sorted_tables if table.name not in tables
+    ]
+    with engine.begin() as connection:
+        # Reflect on the same connection; the writer pool may hold only one
+        inspector = inspect(connection)
+        for table in db.metadata.sorted_tables:
+            if table.name not in tables:
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}'
+                if column.server_default is not None:
+                    default = column.server_default.arg
+                    ddl += f" DEFAULT {getattr(default, 'text', None) or repr(str(default))}"
+                connection.exec_driver_sql(ddl)
+                actions.append(f'added column {table.name}.{column.name}')
+
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for name in indexes.intersection(retired_indexes):
+                connection.exec_driver_sql(f'DROP INDEX {name}')
+                actions.append(f'dropped index {name}')
+            for index in table.indexes:
+                if index.name in indexes:
+                    continue
+                index.create(bind=connection)
+                actions.append(f'created index {index.name}')
+    return actions
+
+
+def explain(db, query):
+    """Return SQLite's EXPLAIN QUERY PLAN rows for an ORM query or select."""
+    statement = getattr(query, 'statement', query)
+    engine = db.engine
+    compiled = statement.compile(dialect=engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    with engine.connect() as connection:
+        rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params)
+        return [row[-1] for row in rows]
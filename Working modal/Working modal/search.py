@@ -0,0 +1,48 @@
+import re
+
+
+def fts_table(table):
+    return f'{table}_fts'
+
+
+def install_fts(connection, table, columns):
+    """Create an FTS5 index over ``columns`` of ``table``, kept in sync by triggers.
+
+    The index is an external-content table, so the text is stored only once,
+    in ``table``. Returns True when the index was created (and filled from
+    the existing rows), False when it already existed.
+    """
+    fts = fts_table(table)
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+    ).first()
+    names = ', '.join(columns)
+    new = ', '.join(f'new.{column}' for column in columns)
+    old = ', '.join(f'old.{column}' for column in columns)
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{names}, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {names} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new}); END",
+    ]
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+    if exists:
+        return False
+    connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+    return True
+
+
+def match_expression(text):
+    """Turn free text into an FTS5 query that prefix-matches every word.
+
+    Words are quoted, so FTS operators and punctuation typed by users are
+    searched for literally instead of raising syntax errors.
+    """
+    words = re.findall(r'\w+', text or '')
+    return ' '.join(f'"{word}"*' for word in words)
@@ -0,0 +1,195 @@
+import os
+import threading
+import weakref
+
+from flask import current_app, has_request_context, request
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import create_engine, event, orm
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def is_file_sqlite(uri):
+    url = make_url(uri)
+    return url.drivername.startswith('sqlite') and url.database not in (None, '', ':memory:')
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the writer engine of a file SQLite database.
+
+    The writer pool holds SQLITE_WRITE_POOL_SIZE connections (one by
+    default), so requests that write queue up in the pool instead of
+    fighting over the database lock.
+    """
+    if not is_file_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+        return {}
+    return {
+        'poolclass': QueuePool,
+        'pool_size': config['SQLITE_WRITE_POOL_SIZE'],
+        'max_overflow': 0,
+        'connect_args': {
+            'check_same_thread': False,
+            'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000,
+        },
+    }
+
+
+def install_pragmas(engine, config, read_only=False):
+    """Apply the SQLITE_* pragmas to every new connection of ``engine``."""
+    pragmas = [
+        f"journal_mode = {config['SQLITE_JOURNAL_MODE']}",
+        f"synchronous = {config['SQLITE_SYNCHRONOUS']}",
+        f"busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT'])}",
+        f"cache_size = {int(config['SQLITE_CACHE_SIZE'])}",
+        f"mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+        'temp_store = MEMORY',
+    ]
+    if read_only:
+        pragmas.append('query_only = ON')
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f'PRAGMA {pragma}')
+        cursor.close()
+
+
+def read_only(view):
+    """Mark a view as read-only so every statement of its GET requests, not
+    just the SELECTs, uses the reader pool."""
+    view.read_only = True
+    return view
+
+
+def in_read_only_request():
+    if not has_request_context() or request.method not in READ_METHODS:
+        return False
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'read_only', False)
+
+
+class RoutingSession(SignallingSession):
+    """Sends SELECTs to the reader engine until the transaction writes.
+
+    The writer connection is only checked out by a flush or a DML
+    statement, so a request that reads and then renders never holds it.
+    Once the transaction has written, its reads go to the writer too, to
+    see its own changes, until it commits or rolls back. Anything flushed
+    goes to the writer, so a view marked read-only by mistake keeps
+    working, just without the benefit of the reader pool.
+    """
+
+    def __init__(self, db, **options):
+        self.db = db
+        self._writing = False
+        super().__init__(db, **options)
+
+    def get_bind(self, mapper=None, clause=None):
+        if self._flushing or getattr(clause, 'is_dml', False):
+            self._writing = True
+        elif not self._writing and (getattr(clause, 'is_select', False) or in_read_only_request()):
+            reader = self.db.get_reader(self.app)
+            if reader is not None:
+                return reader
+        return super().get_bind(mapper, clause)
+
+    def commit(self):
+        try:
+            super().commit()
+        finally:
+            self._writing = self.in_transaction() and self._writing
+
+    def rollback(self):
+        try:
+            super().rollback()
+        finally:
+            self._writing = self.in_transaction() and self._writing
+
+    def close(self):
+        super().close()
+        self._writing = False
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """Flask-SQLAlchemy with the SQLite engine profile and a pooled read engine.
+
+    With SQLITE_READ_POOL_SIZE above zero, SELECTs run on a separate pool
+    of ``query_only`` connections (see ``RoutingSession``). In WAL mode
+    those read a consistent snapshot while the writer commits.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._readers = {}
+        self._readers_lock = threading.Lock()
+        self._apps = weakref.WeakSet()
+        self._fork_hook = False
+        super().__init__(*args, **kwargs)
+
+    def init_app(self, app):
+        super().init_app(app)
+        self._apps.add(app)
+        # One hook for every app this instance serves, however many are built
+        if not self._fork_hook and hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+            self._fork_hook = True
+
+    def _after_fork(self):
+        for app in list(self._apps):
+            self.reset_after_fork(app)
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        engine = super().create_engine(sa_url, engine_opts)
+        if engine.dialect.name == 'sqlite':
+            install_pragmas(engine, self.get_app().config)
+        return engine
+
+    def get_reader(self, app):
+        config = app.config
+        if not config['SQLITE_READ_POOL_SIZE'] or not is_file_sqlite(config['SQLALCHEMY_DATABASE_URI']):
+            return None
+        writer = self.get_engine(app)
+        reader = self._readers.get(app)
+        if reader is not None and reader.url == writer.url:
+            return reader
+        with self._readers_lock:
+            stale = self._readers.get(app)
+            if stale is not None and stale.url == writer.url:
+                return stale
+            reader = create_engine(
+                writer.url,
+                poolclass=QueuePool,
+                pool_size=config['SQLITE_READ_POOL_SIZE'],
+                max_overflow=0,
+                connect_args={
+                    'check_same_thread': False,
+                    'timeout': config['SQLITE_BUSY_TIMEOUT'] / 1000,
+                },
+            )
+            install_pragmas(reader, config, read_only=True)
+            self._readers[app] = reader
+        if stale is not None:
+            stale.dispose()
+        return reader
+
+    def reset_after_fork(self, app):
+        """Forget the pooled connections a forked worker inherited, without closing
+        them under the parent, so the worker opens its own.
+        """
+        self._readers_lock = threading.Lock()
+        with app.app_context():
+            self.get_engine(app).dispose(close=False)
+        for reader in self._readers.values():
+            reader.dispose(close=False)
+
+    def dispose_readers(self):
+        with self._readers_lock:
+            readers = list(self._readers.values())
+            self._readers.clear()
+        for reader in readers:
+            reader.dispose()
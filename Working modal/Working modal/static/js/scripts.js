@@ -0,0 +1,91 @@
+document.addEventListener('DOMContentLoaded', function() {
+    // Enable tooltips
+    $('[data-toggle="tooltip"]').tooltip();
+    
+    // Enable popovers
+    $('[data-toggle="popover"]').popover();
+    
+    // Auto-hide alerts after 5 seconds
+    setTimeout(function() {
+        $('.alert').fadeOut('slow');
+    }, 5000);
+    
+    // Poll the unread count for the badge; hidden tabs skip their turn
+    const badge = $('#notificationBadge');
+    if (badge.length) {
+        const poll = function() {
+            if (!document.hidden) {
+                refreshNotificationBadge();
+            }
+        };
+        poll();
+        setInterval(poll, (badge.data('poll') || 30) * 1000);
+        document.addEventListener('visibilitychange', poll);
+    }
+    
+    // Material download tracking, including buttons added by "Load more"
+    $(document).on('click', '.download-btn', function() {
+        const materialId = $(this).data('id');
+        // Send AJAX request to track download
+        $.post('/materials/track', { material_id: materialId });
+    });
+    
+    // Mark notifications as read when clicked
+    $('.notification-item').on('click', function() {
+        const notificationId = $(this).data('id');
+        // Send AJAX request to mark as read
+        $.post('/notifications/mark-read', { notification_id: notificationId }, function(data) {
+            updateNotificationBadge(data.unread);
+        });
+    });
+    
+    // Append the next page of a paginated list
+    $(document).on('click', '.load-more', function() {
+        const button = $(this);
+        button.prop('disabled', true);
+        $.get(button.data('url'), { cursor: button.data('cursor') }, function(html, status, xhr) {
+            $(button.data('target')).append(html);
+            const next = xhr.getResponseHeader('X-Next-Cursor');
+            if (next) {
+                button.data('cursor', next).prop('disabled', false);
+            } else {
+                button.closest('div').remove();
+            }
+        });
+    });
+});
+
+function refreshNotificationBadge() {
+    // no-cache revalidates with the ETag, so an unchanged count comes back as a 304
+    fetch('/notifications/count', { cache: 'no-cache', credentials: 'same-origin' })
+        .then(function(response) {
+            return response.status === 200 ? response.json() : null;
+        })
+        .then(function(data) {
+            if (data) {
+                updateNotificationBadge(data.count);
+            }
+        });
+}
+
+function updateNotificationBadge(count) {
+    const badge = $('#notificationBadge');
+    
+    if (count > 0) {
+        badge.text(count).show();
+    } else {
+        badge.hide();
+    }
+}
+
+// Dark mode toggle
+$('#darkModeToggle').on('change', function() {
+    $('body').toggleClass('dark-mode');
+    localStorage.setItem('darkMode', $(this).is(':checked'));
+});
+
+// Check for saved dark mode preference
+if (localStorage.getItem('darkMode') === 'true') {
+    $('#darkModeToggle').prop('checked', true);
+    $('body').addClass('dark-mode');
+}
\ No newline at end of file
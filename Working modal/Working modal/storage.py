@@ -0,0 +1,81 @@
+import hashlib
+import os
+import tempfile
+
+
+class ContentStore:
+    """Stores uploaded files under the SHA-256 of their contents.
+
+    Files live at ``objects/ab/cd/abcd...`` below ``root``, so identical
+    uploads share one file on disk. Keeping count of how many records point
+    at each file is left to the caller.
+    """
+
+    def __init__(self, root=None, chunk_size=64 * 1024):
+        self.root = root
+        self.chunk_size = chunk_size
+
+    def init_app(self, app):
+        self.root = app.config['UPLOAD_FOLDER']
+        self.chunk_size = app.config['UPLOAD_CHUNK_SIZE']
+        os.makedirs(self.root, exist_ok=True)
+        app.extensions['content_store'] = self
+
+    def path_for(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest[2:4], digest)
+
+    def save(self, stream):
+        """Copy ``stream`` to the store; returns ``(digest, size, created)``."""
+        digest, size, tmp_path = self.stage(stream)
+        return digest, size, self.place(digest, tmp_path)
+
+    def stage(self, stream):
+        """Copy ``stream`` to a temporary file in fixed-size chunks while hashing it.
+
+        Returns ``(digest, size, tmp_path)``; hand ``tmp_path`` to ``place``
+        or ``discard``.
+        """
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        sha256 = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while True:
+                    chunk = stream.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    sha256.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            self.discard(tmp_path)
+            raise
+        return sha256.hexdigest(), size, tmp_path
+
+    def place(self, digest, tmp_path):
+        """Move a staged file into place; returns False if the file was already there.
+
+        The staged copy replaces an existing file rather than being dropped.
+        The contents are identical and the rename is atomic, and it means a
+        file deleted a moment ago by its last reference's release is back
+        once the new reference has been taken.
+        """
+        target = self.path_for(digest)
+        existed = os.path.exists(target)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+        return not existed
+
+    def discard(self, tmp_path):
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+    def delete(self, digest):
+        try:
+            os.remove(self.path_for(digest))
+        except FileNotFoundError:
+            pass
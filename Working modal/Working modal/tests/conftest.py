@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import User, create_app, db
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on an empty database of its own."""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'TEMPLATE_CACHE_DIR': None,
+    })
+    with app.app_context():
+        db.create_all()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.get_engine(app).dispose()
+    db.dispose_readers()
+
+
+@pytest.fixture
+def client_for(app):
+    """``client_for(email)`` returns a test client logged in as that user."""
+    def client_for(email):
+        with app.app_context():
+            user = User.query.filter_by(email=email).one()
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['user_id'] = user.id
+            session['user_name'] = user.name
+            session['user_role'] = user.role
+        return client
+    return client_for
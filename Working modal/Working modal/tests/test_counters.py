@@ -0,0 +1,73 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app import Counter, LeaveApplication, User, bump_counter, create_notification, db, rebuild_counters
+
+
+@pytest.fixture(autouse=True)
+def users(app):
+    with app.app_context():
+        db.session.add_all([
+            User(name='Admin', email='admin@example.com', password='x', role='admin'),
+            User(name='Teacher', email='teacher@example.com', password='x', role='faculty', department='CS'),
+            User(name='Student', email='student@example.com', password='x', role='student', department='CS'),
+        ])
+        db.session.commit()
+        rebuild_counters()
+
+
+def counters():
+    return {(counter.name, counter.user_id): counter.value for counter in Counter.query if counter.value}
+
+
+def user_id(email):
+    return User.query.filter_by(email=email).one().id
+
+
+def test_counters_kept_by_writes_match_a_rebuild(app, client_for):
+    admin, teacher, student = (client_for(f'{name}@example.com') for name in ('admin', 'teacher', 'student'))
+    app.test_client().post('/register', data={
+        'name': 'New', 'email': 'new@example.com', 'password': 'secret', 'role': 'student', 'department': 'CS'
+    })
+    with app.app_context():
+        teacher_id, student_id = user_id('teacher@example.com'), user_id('student@example.com')
+        new_id = user_id('new@example.com')
+        create_notification(student_id, 'Welcome')
+        create_notification(student_id, 'Timetable changed')
+
+    start = date.today() + timedelta(days=1)
+    for days in (0, 2, 4):
+        student.post('/leave', data={
+            'start_date': f'{start + timedelta(days=days):%Y-%m-%d}',
+            'end_date': f'{start + timedelta(days=days):%Y-%m-%d}',
+            'reason': 'Trip',
+        })
+    with app.app_context():
+        leave_ids = [leave.id for leave in LeaveApplication.query.order_by(LeaveApplication.id)]
+    teacher.post('/leave/decisions', data={'decision': 'approve', 'leave_ids': leave_ids[:2]})
+
+    for content in ('Hi', 'Are you there?', 'Ping'):
+        student.post('/chat/send', data={'recipient_id': teacher_id, 'content': content})
+    teacher.post('/chat/send', data={'recipient_id': student_id, 'content': 'Yes'})
+    teacher.post('/chat/read', data={'partner': student_id})
+    student.post('/notifications/mark-read', data={'notification_id': 1})
+    admin.get(f'/admin/users/delete/{new_id}')
+
+    with app.app_context():
+        kept = counters()
+        rebuild_counters()
+        assert kept == counters()
+        assert kept[('pending_leaves', 0)] == 1
+        assert kept[('users', 0)] == 3
+        assert kept[('unread_messages', student_id)] == 1
+        assert ('unread_messages', teacher_id) not in kept
+
+
+def test_negative_bump_of_a_missing_counter_stays_at_zero(app):
+    with app.app_context():
+        Counter.query.delete()
+        bump_counter('unread_messages', -2, user_id('student@example.com'))
+        db.session.commit()
+
+        assert Counter.query.one().value == 0
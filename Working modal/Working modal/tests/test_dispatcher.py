@@ -0,0 +1,20 @@
+from app import Notification, User, db, fan_out_notification
+
+
+def test_drain_writes_jobs_still_queued(app, monkeypatch):
+    app.config['NOTIFICATION_DISPATCH_SYNC'] = False
+    with app.app_context():
+        db.session.add_all([
+            User(name=f'Student {n}', email=f'student{n}@example.com', password='x', role='student')
+            for n in range(3)
+        ])
+        db.session.commit()
+        # Queue without starting the worker thread, as if the process were stopping
+        dispatcher = app.extensions['notification_dispatcher']
+        monkeypatch.setattr(dispatcher, '_ensure_worker', lambda: None)
+        fan_out_notification('Exams moved', role='student')
+        fan_out_notification('Library closed', role='student')
+
+        assert dispatcher.drain() == 2
+        assert Notification.query.count() == 6
+        assert dispatcher.drain() == 0
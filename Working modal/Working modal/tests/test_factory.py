@@ -0,0 +1,38 @@
+from app import Announcement, User, content_store, create_app, db, identity_cache, job_runner, password_hasher
+
+EXTENSIONS = ('content_store', 'notification_dispatcher', 'password_hasher', 'job_runner', 'download_tracker',
+              'identity_cache', 'compiled_timetables', 'request_metrics', 'asset_pipeline')
+
+
+def test_a_second_app_leaves_the_first_apps_extensions_alone(app, tmp_path):
+    other = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'other.db'}",
+        'UPLOAD_FOLDER': str(tmp_path / 'other-uploads'),
+        'TEMPLATE_CACHE_DIR': None,
+        'PASSWORD_HASH_QUEUE': 1,
+        'USER_CACHE_TTL': 30,
+    })
+    with other.app_context():
+        db.create_all()
+
+    for name in EXTENSIONS:
+        assert app.extensions[name] is not other.extensions[name]
+    with app.app_context():
+        assert content_store.root == app.config['UPLOAD_FOLDER']
+        assert password_hasher.app is app
+        assert identity_cache.ttl == 0
+        admin = User(name='Admin', email='admin@example.com', password='x', role='admin')
+        db.session.add(admin)
+        db.session.commit()
+
+        def post(job):
+            db.session.add(Announcement(title='Exam', content='Room 4', posted_by=admin.id))
+            db.session.commit()
+
+        job_runner.submit('Post', post)
+        assert Announcement.query.count() == 1
+    with other.app_context():
+        assert identity_cache.ttl == 30
+        assert Announcement.query.count() == 0
+        assert job_runner.recent() == []
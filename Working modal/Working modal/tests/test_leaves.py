@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+
+import pytest
+
+from app import LeaveApplication, User, db
+
+
+@pytest.fixture(autouse=True)
+def users(app):
+    with app.app_context():
+        teacher = User(name='Teacher', email='teacher@example.com', password='x', role='faculty', department='CS')
+        student = User(name='Student', email='student@example.com', password='x', role='student', department='CS')
+        db.session.add_all([teacher, student])
+        db.session.flush()
+        # Saved before leave length was limited
+        db.session.add(LeaveApplication(
+            applicant_id=student.id, start_date=date.today(), end_date=date.max, reason='Sabbatical'
+        ))
+        db.session.commit()
+
+
+@pytest.mark.parametrize('days, ahead', [(60, 0), (1, 365)])
+def test_leave_application_refuses_long_or_far_off_leave(app, client_for, days, ahead):
+    start = date.today() + timedelta(days=ahead)
+    response = client_for('student@example.com').post('/leave', data={
+        'start_date': f'{start:%Y-%m-%d}',
+        'end_date': f'{start + timedelta(days=days):%Y-%m-%d}',
+        'reason': 'Trip',
+    })
+
+    assert response.status_code == 302
+    with app.app_context():
+        assert LeaveApplication.query.count() == 1
+
+
+def test_manage_leaves_handles_leave_ending_at_date_max(client_for):
+    response = client_for('teacher@example.com').get('/leave/manage')
+
+    assert response.status_code == 200
+    assert b'Sabbatical' in response.data
+
+
+@pytest.mark.parametrize('month, missing', [('9998-12', b'month=9999-01'), ('0002-01', b'month=0001-12')])
+def test_leave_calendar_stops_at_the_edges(client_for, month, missing):
+    response = client_for('teacher@example.com').get(f'/leave/calendar?month={month}')
+
+    assert response.status_code == 200
+    assert missing not in response.data
+
+
+@pytest.mark.parametrize('month', ['9999-12', '1-1'])
+def test_leave_calendar_falls_back_to_this_month_outside_its_range(client_for, month):
+    response = client_for('teacher@example.com').get(f'/leave/calendar?month={month}')
+
+    assert response.status_code == 200
+    assert date.today().strftime('%B %Y').encode() in response.data
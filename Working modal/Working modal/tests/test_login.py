@@ -0,0 +1,52 @@
+import pytest
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from app import User, db
+
+
+@pytest.fixture(autouse=True)
+def cheap_hashes(app):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+
+
+def add_user(app, pwhash):
+    with app.app_context():
+        db.session.add(User(name='Student', email='student@example.com', password=pwhash,
+                            role='student', department='CS'))
+        db.session.commit()
+
+
+def stored_hash(app):
+    with app.app_context():
+        return User.query.filter_by(email='student@example.com').one().password
+
+
+def login(app, password):
+    return app.test_client().post('/login', data={'email': 'student@example.com', 'password': password})
+
+
+@pytest.mark.parametrize('old_method', ['pbkdf2:sha256:1000', 'pbkdf2:sha1:2000'])
+def test_login_upgrades_an_old_hash(app, old_method):
+    add_user(app, generate_password_hash('secret', old_method))
+
+    assert login(app, 'secret').status_code == 302
+
+    new_hash = stored_hash(app)
+    assert new_hash.startswith('pbkdf2:sha256:2000$')
+    assert check_password_hash(new_hash, 'secret')
+
+
+def test_login_keeps_a_current_hash(app):
+    current = generate_password_hash('secret', 'pbkdf2:sha256:2000', salt_length=16)
+    add_user(app, current)
+
+    assert login(app, 'secret').status_code == 302
+    assert stored_hash(app) == current
+
+
+def test_failed_login_leaves_the_hash_alone(app):
+    old = generate_password_hash('secret', 'pbkdf2:sha256:1000')
+    add_user(app, old)
+
+    assert login(app, 'wrong').status_code == 200
+    assert stored_hash(app) == old
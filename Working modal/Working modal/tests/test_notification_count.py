@@ -0,0 +1,31 @@
+import pytest
+
+from app import BroadcastNotification, User, create_notification, db
+
+
+@pytest.fixture(autouse=True)
+def users(app):
+    with app.app_context():
+        db.session.add(User(name='Student', email='student@example.com', password='x', role='student'))
+        db.session.commit()
+
+
+def test_notification_count_answers_unchanged_counts_with_304(app, client_for):
+    client = client_for('student@example.com')
+    first = client.get('/notifications/count')
+    assert first.get_json() == {'count': 0}
+
+    unchanged = client.get('/notifications/count', headers={'If-None-Match': first.headers['ETag']})
+    assert unchanged.status_code == 304
+
+    with app.app_context():
+        create_notification(User.query.one().id, 'Hello')
+        db.session.add(BroadcastNotification(content='Exams moved', role='student'))
+        db.session.commit()
+    changed = client.get('/notifications/count', headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert changed.get_json() == {'count': 2}
+
+
+def test_notification_count_is_empty_when_logged_out(app):
+    assert app.test_client().get('/notifications/count').status_code == 204
@@ -0,0 +1,62 @@
+import re
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import BroadcastNotification, Notification, User, db
+
+
+START = datetime(2024, 3, 1, 9, 0)
+
+
+@pytest.fixture(autouse=True)
+def feed(app):
+    app.config['PAGE_SIZE'] = 3
+    with app.app_context():
+        student = User(name='Student', email='student@example.com', password='x', role='student',
+                       department='CS', created_at=START)
+        db.session.add(student)
+        db.session.flush()
+        # Personal rows every 10 minutes, broadcasts every 15, so the sources
+        # interleave unevenly and meet on the hour and half hour
+        for n in range(8):
+            db.session.add(Notification(user_id=student.id, content=f'personal {n}',
+                                        created_at=START + timedelta(minutes=10 * n)))
+        for n in range(5):
+            db.session.add(BroadcastNotification(content=f'broadcast {n}', role='student',
+                                                 created_at=START + timedelta(minutes=15 * n)))
+        # Two broadcasts posted in the same instant are ordered by id
+        db.session.add_all([
+            BroadcastNotification(content='broadcast same 1', role='student', created_at=START),
+            BroadcastNotification(content='broadcast same 2', role='student', created_at=START),
+        ])
+        db.session.commit()
+
+
+def titles(html):
+    return re.findall(r'<h6 class="mb-1">(.*?)</h6>', html)
+
+
+def walk(client):
+    page = client.get('/notifications').get_data(as_text=True)
+    seen = [titles(page)]
+    cursor = re.search(r'data-cursor="([^"]*)"', page)
+    cursor = cursor and cursor.group(1)
+    while cursor:
+        response = client.get('/notifications/more', query_string={'cursor': cursor})
+        seen.append(titles(response.get_data(as_text=True)))
+        cursor = response.headers['X-Next-Cursor']
+    return seen
+
+
+def test_feed_pages_through_both_sources_without_gaps_or_repeats(app, client_for):
+    pages = walk(client_for('student@example.com'))
+    seen = [title for page in pages for title in page]
+
+    assert all(len(page) == 3 for page in pages[:-1])
+    assert len(seen) == len(set(seen)) == 15
+    with app.app_context():
+        times = {n.content: n.created_at for n in Notification.query}
+        times.update((n.content, n.created_at) for n in BroadcastNotification.query)
+    assert [times[title] for title in seen] == sorted(times.values(), reverse=True)
+    assert seen.index('broadcast same 2') < seen.index('broadcast same 1')
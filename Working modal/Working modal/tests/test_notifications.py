@@ -0,0 +1,89 @@
+import pytest
+
+from app import BroadcastNotification, Notification, User, create_notification, db
+
+
+@pytest.fixture(autouse=True)
+def users(app):
+    with app.app_context():
+        db.session.add_all([
+            User(name='Student', email='student@example.com', password='x', role='student', department='CS'),
+            User(name='Other', email='other@example.com', password='x', role='student', department='CS'),
+        ])
+        db.session.commit()
+
+
+def user_id(email):
+    return User.query.filter_by(email=email).one().id
+
+
+def broadcast(content, role='student'):
+    notification = BroadcastNotification(content=content, role=role)
+    db.session.add(notification)
+    db.session.commit()
+    return notification.id
+
+
+def unread(client):
+    return client.get('/notifications/count').get_json()['count']
+
+
+def test_mark_read_moves_the_broadcast_watermark(app, client_for):
+    client = client_for('student@example.com')
+    with app.app_context():
+        first = broadcast('Exams moved')
+        broadcast('Library closed')
+        broadcast('Staff meeting', role='faculty')
+    assert unread(client) == 2
+
+    assert client.post('/notifications/mark-read', data={'broadcast_id': first}).get_json()['unread'] == 1
+    assert client.post('/notifications/mark-read', data={'all': '1'}).get_json()['unread'] == 0
+
+    with app.app_context():
+        broadcast('Term starts')
+    assert unread(client) == 1
+
+
+def test_mark_read_by_id_only_touches_the_users_own_rows(app, client_for):
+    client = client_for('student@example.com')
+    with app.app_context():
+        create_notification(user_id('student@example.com'), 'Mine')
+        create_notification(user_id('other@example.com'), 'Theirs')
+        ids = [notification.id for notification in Notification.query.order_by(Notification.id)]
+
+    result = client.post('/notifications/mark-read', data={'notification_ids': ','.join(map(str, ids))}).get_json()
+
+    assert result == {'updated': 1, 'unread': 0}
+    assert unread(client_for('other@example.com')) == 1
+
+
+def test_opening_notifications_marks_the_page_read(app, client_for):
+    client = client_for('student@example.com')
+    with app.app_context():
+        create_notification(user_id('student@example.com'), 'Mine')
+        broadcast('Exams moved')
+    assert unread(client) == 2
+
+    page = client.get('/notifications')
+
+    assert b'Mine' in page.data and b'Exams moved' in page.data
+    assert unread(client) == 0
+
+
+def test_clear_all_removes_personal_rows_and_hides_broadcasts(app, client_for):
+    client = client_for('student@example.com')
+    with app.app_context():
+        create_notification(user_id('student@example.com'), 'Mine')
+        broadcast('Exams moved')
+
+    assert client.post('/notifications/clear').get_json() == {'deleted': 1}
+
+    page = client.get('/notifications')
+    assert b'Mine' not in page.data and b'Exams moved' not in page.data
+    assert unread(client) == 0
+    # Other students still see the broadcast
+    assert b'Exams moved' in client_for('other@example.com').get('/notifications').data
+
+    with app.app_context():
+        broadcast('Term starts')
+    assert b'Term starts' in client.get('/notifications').data
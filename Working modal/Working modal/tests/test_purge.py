@@ -0,0 +1,53 @@
+import pytest
+
+from app import Announcement, User, db, job_runner, purge_users
+
+
+@pytest.fixture(autouse=True)
+def users(app):
+    with app.app_context():
+        admin = User(name='Admin', email='admin@example.com', password='x', role='admin')
+        teachers = [
+            User(name=f'Teacher {n}', email=f'teacher{n}@example.com', password='x',
+                 role='faculty', department='CS')
+            for n in range(2)
+        ]
+        db.session.add_all([admin] + teachers)
+        db.session.flush()
+        db.session.add_all([
+            Announcement(title='Exam', content='Room 4', posted_by=teacher.id) for teacher in teachers
+        ])
+        db.session.commit()
+
+
+def test_purge_users_command_rejects_heir_in_purge_set(app):
+    result = app.test_cli_runner().invoke(args=[
+        'purge-users', '--role', 'faculty', '--department', 'CS', '--reassign-to', 'teacher0@example.com'
+    ])
+
+    assert result.exit_code != 0
+    assert 'would be purged too' in result.output
+    with app.app_context():
+        assert User.query.filter_by(role='faculty').count() == 2
+
+
+def test_purge_users_command_reassigns_to_heir_outside_purge_set(app):
+    result = app.test_cli_runner().invoke(args=[
+        'purge-users', '--role', 'faculty', '--department', 'CS', '--reassign-to', 'admin@example.com'
+    ])
+
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        admin = User.query.filter_by(email='admin@example.com').one()
+        assert User.query.filter_by(role='faculty').count() == 0
+        assert {a.posted_by for a in Announcement.query} == {admin.id}
+
+
+def test_purge_users_job_fails_instead_of_looping_when_heir_is_purged(app):
+    with app.app_context():
+        teacher_ids = [user.id for user in User.query.filter_by(role='faculty')]
+        job = job_runner.submit('Purge', purge_users, teacher_ids, reassign_to=teacher_ids[0])
+
+        assert job.state == 'failed'
+        assert 'being deleted' in job.error
+        assert User.query.filter_by(role='faculty').count() == 2
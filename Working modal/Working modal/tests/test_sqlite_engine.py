@@ -0,0 +1,32 @@
+from flask import jsonify
+
+from app import User, db
+
+
+def writer_in_use(app):
+    return db.get_engine(app).pool.checkedout()
+
+
+def test_selects_leave_the_writer_free_until_the_request_writes(app):
+    @app.route('/_probe', methods=['POST'])
+    def probe():
+        before = (User.query.count(), writer_in_use(app))
+        db.session.add(User(name='New', email='new@example.com', password='x', role='student'))
+        db.session.flush()
+        # The transaction has written, so it must read its own row from the writer
+        during = (User.query.count(), writer_in_use(app))
+        db.session.commit()
+        return jsonify(before=before, during=during, after=writer_in_use(app))
+
+    assert app.test_client().post('/_probe').get_json() == {
+        'before': [0, 0], 'during': [1, 1], 'after': 0
+    }
+
+
+def test_rollback_sends_selects_back_to_the_reader(app):
+    with app.app_context():
+        db.session.add(User(name='New', email='new@example.com', password='x', role='student'))
+        db.session.flush()
+        db.session.rollback()
+        assert User.query.count() == 0
+        assert writer_in_use(app) == 0
@@ -0,0 +1,20 @@
+from app import RETIRED_INDEXES, db
+from schema import upgrade_schema
+
+
+def test_upgrade_db_reports_created_tables(app):
+    with app.app_context():
+        db.session.execute('DROP TABLE counters')
+        db.session.commit()
+
+        assert upgrade_schema(db, RETIRED_INDEXES) == ['created table counters']
+        assert upgrade_schema(db, RETIRED_INDEXES) == []
+
+
+def test_upgrade_db_explains_the_dashboard_queries(app):
+    result = app.test_cli_runner().invoke(args=['upgrade-db'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Schema is up to date' in result.output
+    assert 'dashboard counters:\n  SEARCH counters USING INDEX ix_counters_user_name' in result.output
+    assert 'unread broadcasts:' in result.output
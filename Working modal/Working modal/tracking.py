@@ -0,0 +1,76 @@
+import atexit
+import logging
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedCounter:
+    """Collects per-key increments in memory and writes them out in batches.
+
+    ``write(counts)`` receives a ``{key: increment}`` dict inside an
+    application context. It is called every ``interval`` seconds, as soon as
+    ``threshold`` increments are pending, and once more at interpreter exit.
+    Counts whose write fails are kept for the next attempt.
+    """
+
+    def __init__(self, app=None, write=None, interval=30, threshold=1000):
+        self.write = write
+        self.interval = interval
+        self.threshold = threshold
+        self._pending = Counter()
+        self._total = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app, write)
+
+    def init_app(self, app, write, interval=None):
+        self.app = app
+        self.write = write
+        if interval is not None:
+            self.interval = interval
+        atexit.register(self.flush)
+
+    def record(self, key, amount=1):
+        with self._lock:
+            self._pending[key] += amount
+            self._total += amount
+            full = self._total >= self.threshold
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        """Write every pending increment now; returns how many keys were written."""
+        with self._lock:
+            counts, self._pending = self._pending, Counter()
+            self._total = 0
+        if not counts:
+            return 0
+        try:
+            with self.app.app_context():
+                self.write(dict(counts))
+        except Exception:
+            logger.exception('Could not write %d buffered counts', len(counts))
+            with self._lock:
+                self._pending.update(counts)
+                self._total += sum(counts.values())
+            return 0
+        return len(counts)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='buffered-counter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
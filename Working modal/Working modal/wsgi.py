@@ -0,0 +1,10 @@
+"""Production entry point, for ``gunicorn -c gunicorn.conf.py wsgi:app``.
+
+With ``preload_app`` this module is imported once, in gunicorn's master:
+the app is built and every template compiled before the workers fork, so
+each worker starts warm and shares those pages with the others.
+"""
+from app import create_app, warm_templates
+
+app = create_app()
+warm_templates(app)